@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+import pandas as pd
+import cache
+import data
+import queries
+import synthetic
+import trends
+
+
+# HELPER FUNCTIONS
+def time_call(func, repeat=5):
+    """Return the best wall-clock time of func() over repeat runs, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def measure_stage(stage, func, trace_memory=True):
+    """Run func and return its result with a record of wall time, peak traced memory and rows.
+
+    Wall time comes from an untraced run; with trace_memory the stage runs a second time under
+    tracemalloc, so tracing overhead never inflates the timing.
+    """
+    start = time.perf_counter()
+    result = func()
+    record = {'stage': stage, 'wall_ms': round((time.perf_counter() - start) * 1000, 3)}
+
+    if trace_memory:
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        record['peak_mb'] = round(peak / 1024 ** 2, 3)
+
+    frames = result if isinstance(result, tuple) else (result,)
+    record['rows'] = sum(len(df) for df in frames if isinstance(df, pd.DataFrame))
+    return result, record
+
+
+def legacy_fiscal_half_summary(film_data, tv_data, column_choice):
+    """Per-render fiscal half summary as computed before Fiscal Half and Views moved to ingestion."""
+    frames = []
+    for df, media_type in [(film_data.copy(), 'Film'), (tv_data.copy(), 'TV')]:
+        df['Media'] = media_type
+        df['Fiscal Half'] = df.apply(
+            lambda row: queries.get_fiscal_half(pd.to_datetime(row['Start Date']), pd.to_datetime(row['End Date'])),
+            axis=1
+        )
+        df['Views'] = (df['Hours Viewed'] / (df['Runtime in Minutes'] / 60)).round()
+        frames.append(df)
+
+    combined_data = pd.concat(frames)
+    return combined_data.groupby([column_choice, 'Fiscal Half', 'Start Date'], as_index=False)['Views'].sum()
+
+
+# BENCHMARKS
+def benchmark_fiscal_half_render(dataset, repeat=5):
+    """Compare per-render latency of the fiscal half chart path before and after precomputation.
+
+    The memoized column times get_fiscal_half_render, the (data, spec) pair the dashboard renders.
+    """
+    results = []
+    for column_choice in ['Media', 'Ownership']:
+        results.append({
+            'Grouping': column_choice,
+            'Before (ms)': time_call(
+                lambda: legacy_fiscal_half_summary(dataset.film_data, dataset.tv_data, column_choice), repeat),
+            'After, uncached (ms)': time_call(
+                lambda: queries.build_fiscal_half_summary(dataset, column_choice), repeat),
+            'After, memoized (ms)': time_call(
+                lambda: queries.get_fiscal_half_render(dataset, column_choice), repeat)
+        })
+    return pd.DataFrame(results)
+
+
+def memory_report(frames):
+    """Return the deep memory usage in MB of named frames."""
+    return pd.Series({name: df.memory_usage(deep=True).sum() / 1024 ** 2 for name, df in frames.items()})
+
+
+def benchmark_memory(folder):
+    """Compare the deep memory usage of the title frames with and without the compact schema."""
+    results = {}
+    for label, compact in [('Before (MB)', False), ('After (MB)', True)]:
+        dataset = data.ViewershipDataset(folder, compact=compact)
+        results[label] = memory_report({
+            'film_data': dataset.film_data,
+            'tv_data': dataset.tv_data,
+            'engagement_data': dataset.engagement_data,
+            'rollup': dataset.rollup
+        })
+    report = pd.DataFrame(results)
+    report.loc['Total'] = report.sum()
+    return report
+
+
+def run_suite(folder, trace_memory=True):
+    """Time every ingestion and query stage on the workbooks in folder and return one record per stage."""
+    records = []
+
+    def stage(name, func):
+        result, record = measure_stage(name, func, trace_memory)
+        records.append(record)
+        return result
+
+    def parse_cold(cache_folder):
+        cache.clear_cache(cache_folder)
+        return data.process_files_in_folder(folder, cache_folder=cache_folder)
+
+    stage('parse_workbooks', lambda: data.process_files_in_folder(folder, use_cache=False))
+    # Both the timed cold run and its traced rerun start from an empty temporary cache
+    with tempfile.TemporaryDirectory(prefix='benchmark_cache_') as cache_folder:
+        stage('parse_workbooks_cold_cache', lambda: parse_cold(cache_folder))
+        film_raw, tv_raw, engagement_raw = stage('parse_workbooks_warm_cache', lambda: data.process_files_in_folder(
+            folder, cache_folder=cache_folder))
+
+    if not engagement_raw.empty:
+        stage('clean_initial_publish', lambda: data.clean_initial_publish(
+            engagement_raw, pd.concat([film_raw, tv_raw], ignore_index=True)))
+    state = stage('build_frames', lambda: data.ViewershipState(film_raw.copy(), tv_raw.copy(),
+                                                               engagement_raw.copy(), data.compact_schema))
+    rollup = stage('build_rollup', state.build_rollup)
+
+    film_rollup = queries.slice_rollup(rollup, Media='Film')
+    combined_windows = stage('combine_windows', lambda: queries.combine_windows(film_rollup))
+    grouped = stage('group_and_aggregate', lambda: queries.rename_columns(
+        queries.group_and_aggregate(combined_windows), 'Film'))
+    stage('get_top_n_titles', lambda: queries.get_top_n_titles(grouped, 10))
+    index = stage('build_top_n_index', lambda: queries.TopNIndex(grouped))
+    stage('top_n_index_query', lambda: index.top_n('Views', None, 1000))
+
+    matrix = stage('build_trend_matrix', lambda: trends.TrendMatrix(rollup, 'Title'))
+    stage('rising_titles', lambda: matrix.rising(100))
+    stage('trend_rolling_and_deltas', lambda: (matrix.rolling(2), matrix.deltas(1)))
+    stage('decay_curve', matrix.decay_curve)
+
+    stage('dataset_load', lambda: data.ViewershipDataset(folder).film_data)
+    dataset = data.ViewershipDataset(folder)
+    for column_choice in ['Media', 'Ownership']:
+        chart = stage(f'create_fiscal_half_chart_{column_choice.lower()}',
+                      lambda: queries.build_fiscal_half_chart(dataset, column_choice))
+        stage(f'chart_to_dict_{column_choice.lower()}', chart.to_dict)
+    return records
+
+
+def write_results(records, path, config):
+    """Write the stage records as JSON, together with the run configuration."""
+    results = {'generated_at': datetime.now(timezone.utc).isoformat(), 'config': config, 'stages': records}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark ingestion and query stages.')
+    parser.add_argument('folder', nargs='?', help='folder of Excel exports (default: exports, or '
+                                                  '.benchmark_exports with --synthetic)')
+    parser.add_argument('--synthetic', nargs=2, type=int, metavar=('REPORTS', 'TITLES'),
+                        help='generate REPORTS synthetic workbooks with TITLES titles each into folder first')
+    parser.add_argument('--output', default='benchmark_results.json', help='path of the JSON results file')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory runs')
+    parser.add_argument('--compare', action='store_true', help='also compare fiscal half renders and memory '
+                                                               'against the previous implementation')
+    args = parser.parse_args()
+    if args.folder is None:
+        args.folder = '.benchmark_exports' if args.synthetic else data.folder_path
+
+    config = {'folder': os.path.abspath(args.folder), 'trace_memory': not args.no_memory}
+    if args.synthetic:
+        reports, titles_per_report = args.synthetic
+        synthetic.generate_reports(args.folder, reports, titles_per_report)
+        config.update({'synthetic_reports': reports, 'synthetic_titles': titles_per_report})
+
+    records = run_suite(args.folder, trace_memory=not args.no_memory)
+    write_results(records, args.output, config)
+    print(pd.DataFrame(records).to_string(index=False))
+
+    if args.compare:
+        print()
+        print(benchmark_fiscal_half_render(data.ViewershipDataset(args.folder)).round(2).to_string(index=False))
+        print()
+        print(benchmark_memory(args.folder).round(2).to_string())
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pyarrow.parquet as pq
+import metrics
+
+
+# HELPER VARIABLES
+cache_folder = '.cache'
+
+# Bump whenever process_sheet output changes so stale Parquet files are re-parsed
+CACHE_VERSION = 3
+
+# Bump whenever build_rollup output or the frame schema it is built from changes
+ROLLUP_VERSION = 6
+
+# Older rollup cubes of the same exports folder and variant kept for sessions still reading them
+rollup_keep = 1
+
+
+# HELPER FUNCTIONS
+def file_stat(file_path):
+    """Return the size and modification time used to detect changed workbooks."""
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def folder_fingerprint(folder_path, extension='.xlsx'):
+    """Return a hashable fingerprint of the names, sizes and mtimes of the workbooks in a folder."""
+    fingerprint = []
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(extension) and not entry.name.startswith('~$') and entry.is_file():
+                stat = entry.stat()
+                fingerprint.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(fingerprint))
+
+
+def file_content_hash(file_path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def entry_path(file_path, sheet_name, folder=cache_folder):
+    """Return the manifest path for one sheet of one workbook."""
+    return os.path.join(folder, f"{os.path.basename(file_path)}.{sheet_name}.json")
+
+
+def read_entry(file_path, sheet_name, folder=cache_folder):
+    """Read the manifest entry for a sheet, or None if missing or unreadable."""
+    try:
+        with open(entry_path(file_path, sheet_name, folder), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_atomic(path, write):
+    """Write a file through a temporary sibling and rename it into place."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_entry(file_path, sheet_name, entry, folder=cache_folder):
+    """Atomically write the manifest entry for a sheet."""
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+
+    write_atomic(entry_path(file_path, sheet_name, folder), write)
+
+
+def read_parquet(path):
+    """Load a cached sheet through a memory-mapped Parquet read."""
+    df = pq.read_table(path, memory_map=True).to_pandas()
+
+    # Parquet restores missing strings as None, while read_excel produces NaN
+    object_columns = df.select_dtypes('object').columns
+    df[object_columns] = df[object_columns].where(df[object_columns].notna(), np.nan)
+    return df
+
+
+def write_parquet(df, path):
+    """Atomically persist a processed sheet as Parquet."""
+    write_atomic(path, lambda tmp_path: df.to_parquet(tmp_path, engine='pyarrow'))
+
+
+def is_valid_entry(entry, file_path, stat, salt='', folder=cache_folder):
+    """Check that an entry matches the workbook path, version, salt and still has its Parquet file."""
+    return (
+        entry is not None
+        and entry.get('version') == CACHE_VERSION
+        and entry.get('salt', '') == salt
+        and entry.get('path') == os.path.abspath(file_path)
+        and os.path.exists(os.path.join(folder, entry['parquet']))
+        and (entry['size'], entry['mtime_ns']) == (stat['size'], stat['mtime_ns'])
+    )
+
+
+# CACHE FUNCTIONS
+def get_cached_sheet(file_path, sheet_name, loader, salt='', folder=cache_folder):
+    """Return a processed sheet from the Parquet cache, calling loader() to parse it on a miss.
+
+    Entries are keyed by workbook path, size, mtime, content hash and a salt for other inputs of the
+    loader, such as the title exception tables. A workbook whose mtime changed but whose content hash
+    did not (e.g. a re-copied file) is served from the cache without re-parsing.
+    """
+    os.makedirs(folder, exist_ok=True)
+    stat = file_stat(file_path)
+    entry = read_entry(file_path, sheet_name, folder)
+
+    if is_valid_entry(entry, file_path, stat, salt, folder):
+        metrics.increment('sheet_cache_hits')
+        return read_parquet(os.path.join(folder, entry['parquet']))
+
+    content_hash = file_content_hash(file_path)
+    parquet_name = f"{content_hash[:16]}.{sheet_name}.v{CACHE_VERSION}{f'.{salt}' if salt else ''}.parquet"
+    parquet_path = os.path.join(folder, parquet_name)
+
+    if entry is None or entry.get('sha256') != content_hash or entry.get('salt', '') != salt \
+            or not os.path.exists(parquet_path):
+        metrics.increment('sheet_cache_misses')
+        df = loader()
+        if df.empty:
+            return df
+        write_parquet(df, parquet_path)
+    else:
+        df = read_parquet(parquet_path)
+
+    if entry is not None and entry.get('parquet') not in (None, parquet_name):
+        stale_path = os.path.join(folder, entry['parquet'])
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    write_entry(file_path, sheet_name, {
+        'path': os.path.abspath(file_path),
+        'sheet': sheet_name,
+        'size': stat['size'],
+        'mtime_ns': stat['mtime_ns'],
+        'sha256': content_hash,
+        'version': CACHE_VERSION,
+        'salt': salt,
+        'parquet': parquet_name
+    }, folder)
+    return df
+
+
+def rollup_scope(folder_path, variant=''):
+    """Return a short hash of the exports folder, variant and cache versions that every cube of it shares."""
+    key = json.dumps([CACHE_VERSION, ROLLUP_VERSION, variant, os.path.abspath(folder_path)])
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def rollup_path(folder_path, fingerprint, variant='', folder=cache_folder):
+    """Return the Parquet path of the rollup cube for an exports folder in a given state."""
+    state = hashlib.sha256(json.dumps(fingerprint).encode()).hexdigest()[:16]
+    return os.path.join(folder, f"rollup.{rollup_scope(folder_path, variant)}.{state}.parquet")
+
+
+def prune_rollups(path, keep=rollup_keep, folder=cache_folder):
+    """Remove older cubes of the same folder and variant as path, keeping the keep most recent besides it.
+
+    Cubes of other folders and variants are left alone, and the most recent older cubes stay for readers
+    still pinned to the snapshots they back.
+    """
+    scope = os.path.basename(path).split('.')[1]
+    older = []
+    for filename in os.listdir(folder):
+        parts = filename.split('.')
+        if filename.startswith('rollup.') and filename.endswith('.parquet') and len(parts) == 4 \
+                and parts[1] == scope and os.path.join(folder, filename) != path:
+            older.append(os.path.join(folder, filename))
+    older.sort(key=os.path.getmtime, reverse=True)
+    for old_path in older[keep:]:
+        os.remove(old_path)
+
+
+def get_cached_rollup(folder_path, fingerprint, loader, variant='', folder=cache_folder):
+    """Return the rollup cube for a folder fingerprint from Parquet, calling loader() to build it on a miss.
+
+    Older cubes of the same folder and variant are pruned when a new one is written.
+    """
+    os.makedirs(folder, exist_ok=True)
+    path = rollup_path(folder_path, fingerprint, variant, folder)
+    if os.path.exists(path):
+        return read_parquet(path)
+
+    df = loader()
+    write_parquet(df, path)
+    prune_rollups(path, folder=folder)
+    return df
+
+
+def ensure_rollup(folder_path, fingerprint, loader, variant='', folder=cache_folder):
+    """Return the Parquet path of the rollup cube for a folder fingerprint, calling loader() to write it on a miss.
+
+    Unlike get_cached_rollup, a persisted cube is never read into memory.
+    """
+    os.makedirs(folder, exist_ok=True)
+    path = rollup_path(folder_path, fingerprint, variant, folder)
+    if not os.path.exists(path):
+        write_parquet(loader(), path)
+        prune_rollups(path, folder=folder)
+    return path
+
+
+def clear_cache(folder=cache_folder):
+    """Remove every cached sheet and manifest entry."""
+    if not os.path.isdir(folder):
+        return
+    for filename in os.listdir(folder):
+        if filename.endswith(('.parquet', '.json', '.tmp')):
+            os.remove(os.path.join(folder, filename))
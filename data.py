@@ -1,25 +1,38 @@
 import os
 import re
+from fnmatch import fnmatch
 import pandas as pd
 import numpy as np
+import threading
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+import openpyxl
+from pandas.api.types import union_categoricals
+import cache
+import metrics
+import titles
 
 
 # HELPER VARIABLES
 folder_path = 'exports'
+ingestion_workers = int(os.environ.get('INGESTION_WORKERS', 1))
+compact_schema = os.environ.get('COMPACT_SCHEMA', '1') != '0'
 
-film_data = pd.DataFrame()
-tv_data = pd.DataFrame()
-engagement_data = pd.DataFrame()
+# The DuckDB query backend reads the persisted rollup cube, so datasets leave the frames on disk for it
+out_of_core = os.environ.get('QUERY_BACKEND', 'pandas') == 'duckdb'
 
-group_title_exceptions = {
-    "Bright: Samurai Soul // ブライト: サムライソウル": "Bright: Samurai Soul",
-    "Pokémon the Movie: Secrets of the Jungle": "Pokémon",
-    "Rebel Moon": "Rebel Moon"
-}
+runtime_pattern = re.compile(r'^\s*([+-]?\d+)\s*:\s*([+-]?\d+)\s*$')
 
-licensed_exceptions = {
-    "Arrested Development": "Licensed"
-}
+# End Date follows from Start Date, so it adds no cells; combine_windows reports both
+rollup_dimensions = ['Media', 'Ownership', 'Fiscal Half', 'Start Date', 'End Date', 'Group Title', 'Title',
+                     'Release Date', 'Runtime in Minutes']
+rollup_categories = ['Media', 'Ownership', 'Fiscal Half', 'Group Title', 'Title']
+rollup_measures = ['Views', 'Hours Viewed']
+
+# Repeated strings are dictionary-encoded; summed measures stay float64 so aggregates keep full precision
+category_columns = ['Title', 'Group Title', 'Ownership', 'Media', 'Available Globally?', 'Runtime', 'Fiscal Half']
+downcast_columns = ['Runtime in Minutes']
+date_columns = ['Start Date', 'End Date', 'Release Date']
 
 
 # HELPER FUNCTIONS
@@ -34,13 +47,7 @@ def extract_dates_from_filename(filename):
 
 def get_group_title(title):
     """Get group title based on exceptions or title structure."""
-    group_title = group_title_exceptions.get(title)
-    if group_title:
-        return group_title
-
-    title = re.sub(r'\s\d$', '', title)
-
-    return re.split(':|//', title)[0]
+    return titles.get_normalizer().get_group_title(title)
 
 
 def convert_runtime_to_minutes(runtime):
@@ -65,97 +72,632 @@ def calculate_runtime(row):
 
 def determine_ownership(title, release_date):
     """Check if title is licensed based on exceptions or release date."""
+    licensed_exceptions = titles.get_normalizer().licensed_exceptions
     return licensed_exceptions.get(title, "Licensed" if pd.isnull(release_date) else "Original")
 
 
+# VECTORIZED HELPER FUNCTIONS
+def get_group_titles(title_series):
+    """Vectorized get_group_title over a Series of titles, memoized per raw title."""
+    return titles.get_normalizer().get_group_titles(title_series)
+
+
+def convert_runtimes_to_minutes(runtimes):
+    """Vectorized convert_runtime_to_minutes over a Series of HH:MM strings."""
+    parts = runtimes.str.extract(runtime_pattern).astype(float)
+    return parts[0] * 60 + parts[1]
+
+
+def calculate_runtimes(df):
+    """Vectorized calculate_runtime over the Runtime, Hours Viewed and Views columns of a sheet."""
+    hours_viewed, views = df['Hours Viewed'], df['Views']
+    per_view = np.round(hours_viewed / views.where(views != 0) * 60)
+    return pd.Series(
+        np.where(df['Runtime'] == "*", per_view, convert_runtimes_to_minutes(df['Runtime'])),
+        index=df.index, dtype=float
+    )
+
+
+def get_fiscal_halves(start_dates):
+    """Vectorized fiscal half labels (H1 YYYY / H2 YYYY) as a categorical ordered by start date."""
+    unique_dates = pd.Series(pd.unique(start_dates))
+    parsed = pd.to_datetime(unique_dates)
+    labels = np.where(parsed.dt.month <= 6, 'H1 ', 'H2 ') + parsed.dt.year.astype(str)
+    categories = pd.unique(labels.iloc[np.argsort(parsed.to_numpy(), kind='stable')])
+    return pd.Categorical(start_dates.map(dict(zip(unique_dates, labels))), categories=categories)
+
+
+def determine_ownerships(title_series, release_dates):
+    """Vectorized determine_ownership over Series of titles and release dates."""
+    return titles.get_normalizer().determine_ownerships(title_series, release_dates)
+
+
 # DATA PROCESSING FUNCTIONS
+@metrics.timed('read_sheet')
+def read_sheet(file_path, sheet_name, skiprows=5, skipcols=1, chunk_size=10_000):
+    """Stream a sheet through openpyxl's read-only mode into a DataFrame matching read_excel.
+
+    Rows are converted to typed columns chunk_size rows at a time, so the raw cell tuples never
+    outlive their chunk. Leading rows and columns are skipped by the reader instead of sliced off.
+    Blank rows and trailing unnamed empty columns (formatted but empty cells) are dropped, as read_excel does.
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(min_row=skiprows + 1, min_col=skipcols + 1, values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        columns = [name if name is not None else f"Unnamed: {i + skipcols}" for i, name in enumerate(header)]
+
+        chunks = []
+        for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+            # Drop blank rows before the frame is built, so they never widen the inferred dtypes
+            chunk = [row for row in chunk if any(value is not None for value in row)]
+            if chunk:
+                chunks.append(pd.DataFrame.from_records(chunk, columns=columns))
+    finally:
+        workbook.close()
+
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+    df = df.infer_objects()
+
+    width = len(columns)
+    while width and header[width - 1] is None and df.iloc[:, width - 1].isna().all():
+        width -= 1
+    df = df.iloc[:, :width]
+
+    # Match read_excel, which leaves missing strings as NaN rather than None
+    object_columns = df.select_dtypes('object').columns
+    df[object_columns] = df[object_columns].where(df[object_columns].notna(), np.nan)
+    return df
+
+
+@metrics.timed('process_sheet')
 def process_sheet(file_path, sheet_name, start_date, end_date):
     """Read and process Film, TV, or Engagement sheet."""
     try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name, skiprows=5).iloc[:, 1:]
+        df = read_sheet(file_path, sheet_name)
         df['Start Date'], df['End Date'] = start_date, end_date
-        df['Group Title'] = df['Title'].apply(get_group_title)
-        df['Ownership'] = df.apply(lambda row: determine_ownership(row['Title'], row['Release Date']), axis=1)
+        df['Group Title'] = get_group_titles(df['Title'])
+        df['Ownership'] = determine_ownerships(df['Title'], df['Release Date'])
+        titles.get_normalizer().save()
 
         if sheet_name in ['Film', 'TV']:
             df['Media'] = sheet_name
-            df['Runtime in Minutes'] = df.apply(calculate_runtime, axis=1)
+            df['Runtime in Minutes'] = calculate_runtimes(df)
         return df
     except Exception as e:
         print(f"Error processing {sheet_name} sheet in {file_path}: {e}")
         return pd.DataFrame()
 
 
-def process_files_in_folder(folder_path):
-    """Process all Excel files in the given folder."""
-    global film_data, tv_data, engagement_data
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.xlsx') and not filename.startswith('~$'):
-            file_path = os.path.join(folder_path, filename)
-            start_date, end_date = extract_dates_from_filename(filename)
+def load_sheet(file_path, sheet_name, start_date, end_date, use_cache=True, cache_folder=cache.cache_folder):
+    """Load a processed sheet from the Parquet cache in cache_folder, parsing the workbook only when it changed."""
+    if not use_cache:
+        return process_sheet(file_path, sheet_name, start_date, end_date)
+    return cache.get_cached_sheet(file_path, sheet_name,
+                                  lambda: process_sheet(file_path, sheet_name, start_date, end_date),
+                                  salt=titles.get_normalizer().config_hash, folder=cache_folder)
 
-            if "2023Jan-Jun" in filename:
-                engagement_df = process_sheet(file_path, "Engagement", start_date, end_date)
-                engagement_data = pd.concat([engagement_data, engagement_df], ignore_index=True)
-            else:
-                film_df = process_sheet(file_path, "Film", start_date, end_date)
-                tv_df = process_sheet(file_path, "TV", start_date, end_date)
 
-                film_data = pd.concat([film_data, film_df], ignore_index=True)
-                tv_data = pd.concat([tv_data, tv_df], ignore_index=True)
+def is_selected_report(filename, reports=None):
+    """Return True for Excel exports matching any of the filename patterns in reports, or every export when None."""
+    if not filename.endswith('.xlsx') or filename.startswith('~$'):
+        return False
+    return reports is None or any(fnmatch(filename, pattern) for pattern in reports)
 
 
-def clean_initial_publish(initial_publish, helper_data):
-    """Clean engagement data by filling missing media and runtime values."""
-    helper_data = helper_data.drop_duplicates(['Title'])
-    print(helper_data)
-    initial_publish = initial_publish.merge(helper_data[['Title', 'Media', 'Runtime in Minutes']], on='Title',
-                                            how='left')
-
+def list_sheet_jobs(folder_path, reports=None):
+    """List the (file path, sheet name, start date, end date) parse jobs for the selected Excel files in a folder."""
+    jobs = []
+    for filename in sorted(os.listdir(folder_path)):
+        if is_selected_report(filename, reports):
+            file_path = os.path.join(folder_path, filename)
+            start_date, end_date = extract_dates_from_filename(filename)
+            sheet_names = ["Engagement"] if "2023Jan-Jun" in filename else ["Film", "TV"]
+            jobs.extend((file_path, sheet_name, start_date, end_date) for sheet_name in sheet_names)
+    return jobs
+
+
+def run_sheet_jobs(jobs, use_cache=True, max_workers=1, cache_folder=cache.cache_folder):
+    """Load every sheet job, fanning out across a process pool when max_workers > 1."""
+    if max_workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+            return list(executor.map(load_sheet, *zip(*jobs), [use_cache] * len(jobs), [cache_folder] * len(jobs)))
+    return [load_sheet(*job, use_cache, cache_folder) for job in jobs]
+
+
+def concat_sheets(frames):
+    """Concatenate processed sheets in a single pass, skipping sheets that failed to load."""
+    frames = [df for df in frames if not df.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def combine_sheets(jobs, frames):
+    """Combine loaded sheets into film, TV and engagement frames in job order."""
+    sheets = {"Film": [], "TV": [], "Engagement": []}
+    for (_, sheet_name, _, _), df in zip(jobs, frames):
+        sheets[sheet_name].append(df)
+    return concat_sheets(sheets["Film"]), concat_sheets(sheets["TV"]), concat_sheets(sheets["Engagement"])
+
+
+def process_files_in_folder(folder_path, use_cache=True, max_workers=1, reports=None, cache_folder=cache.cache_folder):
+    """Process the selected Excel files in the given folder, optionally parsing sheets in parallel."""
+    jobs = list_sheet_jobs(folder_path, reports)
+    return combine_sheets(jobs, run_sheet_jobs(jobs, use_cache, max_workers, cache_folder))
+
+
+def build_title_lookup(helper_data):
+    """Index the Media and Runtime of each title from its most recent report, with normalized match keys.
+
+    Rows are ordered most recent first, so the first row of a match key is its most recent title.
+    Match keys already present (e.g. from an earlier lookup folded in with new rows) are reused.
+    """
+    columns = ['Title', 'Media', 'Runtime in Minutes', 'Start Date', 'Match Key', 'Primary Key']
+    if helper_data.empty:
+        return pd.DataFrame(columns=columns)
+
+    lookup = helper_data.sort_values('Start Date', ascending=False, kind='stable').drop_duplicates(['Title'])
+    lookup = lookup.reindex(columns=columns).reset_index(drop=True)
+    # The key columns are all NaN (float) when no sheet carried keys yet
+    lookup[['Match Key', 'Primary Key']] = lookup[['Match Key', 'Primary Key']].astype(object)
+    missing = lookup['Match Key'].isna()
+    lookup.loc[missing, 'Match Key'] = titles.normalize_titles(lookup.loc[missing, 'Title'])
+    lookup.loc[missing, 'Primary Key'] = titles.primary_match_keys(lookup.loc[missing, 'Title'],
+                                                                   lookup.loc[missing, 'Match Key'])
+    return lookup
+
+
+def lookup_titles(title_lookup, title_series, match_keys=None, fallback_keys=None):
+    """Return positions in title_lookup for each title, matching exactly first and then by match key.
+
+    Titles still unmatched fall back to their English name (see titles.fallback_match_keys), which only
+    matches a lookup title without an alternate-language part whose English name no other lookup title
+    shares. Titles with no match get -1.
+    """
+    positions = pd.Index(title_lookup['Title']).get_indexer(title_series)
+    missing = positions == -1
+    if missing.any() and not title_lookup.empty:
+        keys = title_lookup['Match Key']
+        first = ~keys.duplicated().to_numpy()
+        match_keys = titles.normalize_titles(title_series) if match_keys is None else match_keys
+        hits = pd.Index(keys[first]).get_indexer(match_keys[missing])
+        positions[missing] = np.where(hits >= 0, np.flatnonzero(first)[hits], -1)
+
+    missing = positions == -1
+    if missing.any() and not title_lookup.empty:
+        keys, primary_keys = title_lookup['Match Key'], title_lookup['Primary Key']
+        alternate = (keys != primary_keys).to_numpy()
+        candidates = ~alternate & ~primary_keys.isin(primary_keys[alternate]).to_numpy() & first
+        fallback_keys = titles.fallback_match_keys(title_series, match_keys) if fallback_keys is None \
+            else fallback_keys
+        hits = pd.Index(keys[candidates]).get_indexer(fallback_keys[missing])
+        positions[missing] = np.where(hits >= 0, np.flatnonzero(candidates)[hits], -1)
+    return positions
+
+
+@metrics.timed('engagement_backfill')
+def backfill_engagement(initial_publish, title_lookup, match_keys=None, fallback_keys=None):
+    """Fill missing media and runtime values of engagement rows from a title lookup."""
+    initial_publish = initial_publish.copy()
+    positions = lookup_titles(title_lookup, initial_publish['Title'], match_keys, fallback_keys)
+    matched = positions >= 0
+    safe_positions = np.where(matched, positions, 0)
+
+    media = np.full(len(initial_publish), np.nan, dtype=object)
+    runtimes = np.full(len(initial_publish), np.nan)
+    if matched.any():
+        media[matched] = title_lookup['Media'].to_numpy(dtype=object).take(safe_positions[matched])
+        runtimes[matched] = title_lookup['Runtime in Minutes'].to_numpy(dtype=float).take(safe_positions[matched])
 
     # Fill missing 'Media' based on 'Title'
-    initial_publish['Media'] = initial_publish.apply(
-        lambda row: 'TV' if pd.isnull(row['Media']) and 'Season' in row['Title'] else
-        'Film' if pd.isnull(row['Media']) else row['Media'],
-        axis=1
-    )
+    default_media = np.where(initial_publish['Title'].str.contains('Season', regex=False), 'TV', 'Film')
+    initial_publish['Media'] = np.where(pd.isna(media), default_media, media)
 
     # Fill missing 'Runtime in Minutes' with the average runtime for each 'Media'
-    avg_runtimes = helper_data.groupby('Media')['Runtime in Minutes'].mean()
-    initial_publish['Runtime in Minutes'] = initial_publish.apply(
-        lambda row: avg_runtimes.get(row['Media'], np.nan) if pd.isnull(row['Runtime in Minutes']) else row[
-            'Runtime in Minutes'],
-        axis=1
-    )
+    avg_runtimes = title_lookup.groupby('Media', observed=True)['Runtime in Minutes'].mean()
+    initial_publish['Runtime in Minutes'] = pd.Series(runtimes, index=initial_publish.index).fillna(
+        initial_publish['Media'].map(avg_runtimes).astype(float))
 
     return initial_publish
 
 
-def add_media_to_initial_publish(initial_publish):
-    """Split engagement data by media type and append to film_data and tv_data."""
-    global film_data, tv_data
-    film_data = pd.concat([film_data, initial_publish[initial_publish['Media'] == 'Film']], ignore_index=True)
-    tv_data = pd.concat([tv_data, initial_publish[initial_publish['Media'] == 'TV']], ignore_index=True)
+def clean_initial_publish(initial_publish, helper_data):
+    """Clean engagement data by filling missing media and runtime values."""
+    return backfill_engagement(initial_publish, build_title_lookup(helper_data))
 
 
 def convert_columns_to_datetime(df, columns):
-    """Convert specified columns in dataframe to datetime format, with error handling."""
-    for col in columns:
-        df[col] = pd.to_datetime(df[col], errors='coerce').dt.date if df[col].dtype == 'datetime64[ns]' else df[col]
+    """Convert specified columns in dataframe to datetime64, coercing unparseable values to NaT."""
+    for col in [col for col in columns if col in df.columns]:
+        df[col] = pd.to_datetime(df[col], errors='coerce')
+
+
+def downcast_numeric(series):
+    """Downcast a float column to int32 or float32 only when every value survives the round trip."""
+    values = series.to_numpy(dtype=float)
+    finite = values[~np.isnan(values)]
+    if len(finite) == len(values) and np.all(finite == np.round(finite)) \
+            and np.all(np.abs(finite) <= np.iinfo(np.int32).max):
+        return series.astype('int32')
+    if np.all(finite.astype('float32').astype(float) == finite):
+        return series.astype('float32')
+    return series
+
+
+def compact_frame(df):
+    """Dictionary-encode repeated string columns and downcast small numerics in place."""
+    for col in [col for col in category_columns if col in df.columns]:
+        df[col] = df[col].astype('category')
+    for col in [col for col in downcast_columns if col in df.columns]:
+        df[col] = downcast_numeric(df[col])
+    return df
+
+
+def add_fiscal_half_and_views(df):
+    """Add the categorical Fiscal Half column and recompute Views from Hours Viewed and Runtime."""
+    if df.empty:
+        return df
+    df['Fiscal Half'] = get_fiscal_halves(df['Start Date'])
+    df['Views'] = (df['Hours Viewed'] / (df['Runtime in Minutes'] / 60)).round()
+    return df
+
 
+@metrics.timed('prepare_title_rows')
+def prepare_title_rows(df, compact=False):
+    """Convert dates, precompute the chart columns and optionally compact a frame of title rows."""
+    convert_columns_to_datetime(df, date_columns)
 
-# Execute the processing
-process_files_in_folder(folder_path)
+    # Precompute chart columns once so renders never write into the shared frames
+    add_fiscal_half_and_views(df)
 
-# Combine film and TV data to merge with engagement data
-combined_helper = pd.concat([film_data, tv_data], ignore_index=True)
+    return compact_frame(df) if compact else df
 
-# Clean engagement data
-engagement_data = clean_initial_publish(engagement_data, combined_helper)
 
-# Append engagement data to film_data and tv_data
-add_media_to_initial_publish(engagement_data)
+def concat_frames(frames, ignore_index=True):
+    """Concatenate frames, unioning shared categorical columns so they stay dictionary-encoded."""
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame()
 
-# Convert columns to datetime
-convert_columns_to_datetime(film_data, ['Start Date', 'End Date', 'Release Date'])
-convert_columns_to_datetime(tv_data, ['Start Date', 'End Date', 'Release Date'])
+    for col in frames[0].select_dtypes('category').columns:
+        if all(col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype) for df in frames):
+            categories = union_categoricals([df[col] for df in frames], ignore_order=True).categories
+            frames = [df.assign(**{col: df[col].cat.set_categories(categories)}) for df in frames]
+    return pd.concat(frames, ignore_index=ignore_index)
+
+
+def split_by_media(engagement_data):
+    """Split backfilled engagement rows into their film and TV rows."""
+    if engagement_data.empty:
+        return engagement_data, engagement_data
+    return (engagement_data[engagement_data['Media'] == 'Film'],
+            engagement_data[engagement_data['Media'] == 'TV'])
+
+
+@metrics.timed('build_rollup')
+def build_rollup(*frames):
+    """Materialize views and hours per title, ownership and fiscal half with categorical dimensions.
+
+    Missing release dates and runtimes are kept as their own cells so every dashboard query can be
+    answered from the cube alone. Cubes passed back in are additive, so build_rollup(cube, new_rows)
+    folds new rows into an existing cube.
+    """
+    frames = [df[rollup_dimensions + rollup_measures] for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=rollup_dimensions + rollup_measures)
+
+    combined = pd.concat(frames, ignore_index=True)
+    combined[rollup_categories] = combined[rollup_categories].astype('category')
+    rollup = combined.groupby(rollup_dimensions, as_index=False, observed=True, dropna=False)[rollup_measures].sum()
+    for col in rollup_categories:
+        rollup[col] = rollup[col].cat.remove_unused_categories()
+    return rollup
+
+
+# DATASET
+class ViewershipState:
+    """Film, TV and engagement frames plus the intermediates needed to fold in new reports.
+
+    The backfilled engagement rows sit at the end of film_data and tv_data, after the report rows,
+    so a new report only re-backfills the engagement rows it can affect.
+    """
+
+    def __init__(self, film_raw, tv_raw, engagement_raw, compact=False):
+        self.compact = compact
+        self.title_lookup = build_title_lookup(concat_frames([film_raw, tv_raw]))
+        self.engagement_raw = engagement_raw
+        self.engagement_keys = (titles.normalize_titles(engagement_raw['Title']) if not engagement_raw.empty
+                                else pd.Series(dtype=object))
+        # Whether an English name is shared depends on the whole report, so fallback keys are computed once
+        self.engagement_fallback_keys = (titles.fallback_match_keys(engagement_raw['Title'], self.engagement_keys)
+                                         if not engagement_raw.empty else pd.Series(dtype=object))
+        self.engagement_data = self.backfill(engagement_raw)
+        self.base_rollup = None
+        self.assemble(prepare_title_rows(film_raw, compact), prepare_title_rows(tv_raw, compact))
+
+    @property
+    def frames(self):
+        return self.film_data, self.tv_data, self.engagement_data
+
+    def assemble(self, film_base, tv_base):
+        """Append the engagement rows to the film and TV report rows by media type."""
+        engagement_film, engagement_tv = split_by_media(self.engagement_data)
+        self.film_base_rows, self.tv_base_rows = len(film_base), len(tv_base)
+        self.film_data = concat_frames([film_base, engagement_film])
+        self.tv_data = concat_frames([tv_base, engagement_tv])
+
+    def backfill(self, engagement_raw):
+        """Backfill and prepare engagement rows, keeping their index in engagement_raw."""
+        if engagement_raw.empty:
+            return engagement_raw
+        engagement_data = backfill_engagement(engagement_raw, self.title_lookup,
+                                              self.engagement_keys.loc[engagement_raw.index],
+                                              self.engagement_fallback_keys.loc[engagement_raw.index])
+        return prepare_title_rows(engagement_data, self.compact)
+
+    @metrics.timed('add_reports')
+    def add_reports(self, film_raw, tv_raw):
+        """Fold newly parsed Film and TV sheets in, re-backfilling only the affected engagement rows."""
+        new_rows = concat_frames([film_raw, tv_raw])
+        if new_rows.empty:
+            return
+
+        affected = pd.Series(False, index=self.engagement_raw.index)
+        if not self.engagement_raw.empty:
+            # Titles in the new report may now resolve differently (a new title sharing an English name can also
+            # make a fallback ambiguous), and rows that are unmatched or matched to a title without a runtime
+            # were filled with the Media averages, which the new report changes
+            engagement_titles = self.engagement_raw['Title']
+            new_keys = titles.normalize_titles(new_rows['Title'])
+            positions = lookup_titles(self.title_lookup, engagement_titles, self.engagement_keys,
+                                      self.engagement_fallback_keys)
+            runtimes = np.full(len(positions), np.nan)
+            matched = positions >= 0
+            runtimes[matched] = self.title_lookup['Runtime in Minutes'].to_numpy(dtype=float)[positions[matched]]
+            affected = (engagement_titles.isin(new_rows['Title']) | self.engagement_keys.isin(new_keys)
+                        | self.engagement_fallback_keys.isin(titles.primary_match_keys(new_rows['Title'], new_keys))
+                        | np.isnan(runtimes))
+
+        self.title_lookup = build_title_lookup(concat_frames([self.title_lookup, new_rows]))
+
+        film_rows = prepare_title_rows(film_raw, self.compact)
+        tv_rows = prepare_title_rows(tv_raw, self.compact)
+        if self.base_rollup is not None:
+            self.base_rollup = build_rollup(self.base_rollup, film_rows, tv_rows)
+
+        if affected.any():
+            self.engagement_data = concat_frames([
+                self.engagement_data[~affected.to_numpy()],
+                self.backfill(self.engagement_raw[affected])
+            ], ignore_index=False).sort_index()
+
+        self.assemble(concat_frames([self.film_data.iloc[:self.film_base_rows], film_rows]),
+                      concat_frames([self.tv_data.iloc[:self.tv_base_rows], tv_rows]))
+
+    def build_rollup(self):
+        """Return the rollup cube, folding the engagement rows into the cube of report rows."""
+        if self.base_rollup is None:
+            self.base_rollup = build_rollup(self.film_data.iloc[:self.film_base_rows],
+                                            self.tv_data.iloc[:self.tv_base_rows])
+        return build_rollup(self.base_rollup, *split_by_media(self.engagement_data))
+
+
+class DatasetSnapshot:
+    """One version of the film, TV and engagement frames and rollup cube, with the results derived from it.
+
+    Snapshots are never modified after they are built, so any number of sessions can read one while a
+    newer version is ingested. Entry points that share them across sessions enable pandas copy-on-write,
+    so queries slice them into views and any write copies instead of mutating them.
+
+    frames may be a callable loading them and rollup None, for snapshots that stay on disk until read;
+    they are then loaded on first access, once, from the sheet cache and rollup_path.
+    """
+
+    def __init__(self, frames, rollup, rollup_path=None, fingerprint=None, version=0):
+        self._frames = frames
+        self._rollup = rollup
+        self.rollup_path = rollup_path
+        self.fingerprint = fingerprint
+        self.version = version
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._derived = {}
+
+    @property
+    def frames(self):
+        if callable(self._frames):
+            return self.derived(('frames',), lambda snapshot: snapshot._frames())
+        return self._frames
+
+    @property
+    def film_data(self):
+        return self.frames[0]
+
+    @property
+    def tv_data(self):
+        return self.frames[1]
+
+    @property
+    def engagement_data(self):
+        return self.frames[2]
+
+    @property
+    def rollup(self):
+        if self._rollup is None:
+            return self.derived(('rollup',), lambda snapshot: cache.read_parquet(snapshot.rollup_path))
+        return self._rollup
+
+    def derived(self, key, build):
+        """Return the memoized result of build(self) for key, computing it once across concurrent sessions.
+
+        Each key has its own lock, so sessions building different results never wait on each other.
+        """
+        if key in self._derived:
+            return self._derived[key]
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._derived:
+                self._derived[key] = build(self)
+            return self._derived[key]
+
+
+class ViewershipDataset:
+    """Film, TV and engagement data from an exports folder, loaded lazily on first access.
+
+    A rollup cube of views and hours is built alongside the frames and persisted next to the sheet
+    cache. Each ingestion publishes a new DatasetSnapshot in a single assignment, so readers keep the
+    previous snapshot, and its memoized derived() frames, until the new one is complete. Only the
+    sheets of changed workbooks are re-ingested, and newly added reports are folded into the current
+    frames without rebuilding them. refresh() compares a fingerprint of the folder and reloads only
+    when it moved. reports optionally restricts the dataset to workbooks matching filename patterns.
+
+    With out_of_core (and the cache), only the rollup cube is persisted and snapshots hold neither the
+    frames nor the cube in memory: a folder state whose cube is cached is never ingested, and one that is
+    not is ingested once to write the cube and then released. Frames are only re-read from the sheet
+    cache if something asks for them, and every change is a full re-ingestion.
+    """
+
+    def __init__(self, folder_path=folder_path, use_cache=True, max_workers=ingestion_workers,
+                 compact=compact_schema, reports=None, out_of_core=out_of_core):
+        self.folder_path = folder_path
+        self.reports = reports
+        self.use_cache = use_cache
+        self.out_of_core = out_of_core and use_cache
+        self.max_workers = max_workers
+        self.compact = compact
+        self.version = 0
+        self.fingerprint = None
+        self._lock = threading.RLock()
+        self._sheets = {}
+        self._state = None
+        self._snapshot = None
+
+    @property
+    def film_data(self):
+        return self.snapshot().film_data
+
+    @property
+    def tv_data(self):
+        return self.snapshot().tv_data
+
+    @property
+    def engagement_data(self):
+        return self.snapshot().engagement_data
+
+    @property
+    def rollup(self):
+        return self.snapshot().rollup
+
+    @property
+    def rollup_path(self):
+        return self.snapshot().rollup_path
+
+    @property
+    def loaded(self):
+        return self._snapshot is not None
+
+    def snapshot(self):
+        """Return the current DatasetSnapshot, ingesting the folder on first access."""
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._ingest()
+        return self._snapshot
+
+    @metrics.timed('ingest')
+    def _ingest(self):
+        """Load new or changed sheets, reuse unchanged ones and rebuild the combined frames.
+
+        Returns True when any workbook was added, changed or removed since the last ingestion.
+        """
+        fingerprint = self.folder_fingerprint()
+        if self.out_of_core:
+            return self._ingest_out_of_core(fingerprint)
+
+        jobs = list_sheet_jobs(self.folder_path, self.reports)
+        keys = [(file_path, sheet_name) for file_path, sheet_name, _, _ in jobs]
+        stats = [cache.file_stat(file_path) for file_path, _, _, _ in jobs]
+        stale = [i for i, key in enumerate(keys) if key not in self._sheets or self._sheets[key][0] != stats[i]]
+
+        if self._snapshot is not None and not stale and set(keys) == set(self._sheets):
+            self.fingerprint = fingerprint
+            return False
+
+        sheets = {key: self._sheets.get(key) for key in keys}
+        for i, df in zip(stale, run_sheet_jobs([jobs[i] for i in stale], self.use_cache, self.max_workers)):
+            sheets[keys[i]] = (stats[i], df)
+
+        # A workbook that was only added, and has no engagement sheet, is folded into the current state
+        added_only = set(self._sheets) <= set(keys) and all(keys[i] not in self._sheets for i in stale)
+        if self._state is not None and added_only and all(keys[i][1] != "Engagement" for i in stale):
+            film_raw, tv_raw, _ = combine_sheets([jobs[i] for i in stale], [sheets[keys[i]][1] for i in stale])
+            self._state.add_reports(film_raw, tv_raw)
+        else:
+            frames = [sheets[key][1] for key in keys]
+            self._state = ViewershipState(*combine_sheets(jobs, frames), compact=self.compact)
+
+        metrics.increment('sheets_parsed', len(stale))
+        self._sheets = sheets
+        rollup, rollup_path = self._build_rollup(fingerprint)
+        self._snapshot = DatasetSnapshot(self._state.frames, rollup, rollup_path, fingerprint, self.version + 1)
+        self.version += 1
+        self.fingerprint = fingerprint
+        return True
+
+    def _ingest_out_of_core(self, fingerprint):
+        """Publish a snapshot backed by the persisted rollup cube, writing the cube first if it is missing."""
+        if self._snapshot is not None and fingerprint == self.fingerprint:
+            return False
+
+        rollup_path = cache.ensure_rollup(self.folder_path, fingerprint, lambda: self._load_state().build_rollup(),
+                                          self._rollup_variant())
+        self._snapshot = DatasetSnapshot(lambda: self._load_state().frames, None, rollup_path, fingerprint,
+                                         self.version + 1)
+        self.version += 1
+        self.fingerprint = fingerprint
+        return True
+
+    def _load_state(self):
+        """Ingest the selected workbooks into a new ViewershipState, reading unchanged sheets from the cache."""
+        frames = process_files_in_folder(self.folder_path, self.use_cache, self.max_workers, self.reports)
+        return ViewershipState(*frames, compact=self.compact)
+
+    def folder_fingerprint(self):
+        """Return the fingerprint of the selected workbooks in the folder."""
+        return tuple(entry for entry in cache.folder_fingerprint(self.folder_path)
+                     if is_selected_report(entry[0], self.reports))
+
+    def _build_rollup(self, fingerprint):
+        """Return the rollup cube for the current state and its Parquet path, reusing the persisted cube."""
+        if not self.use_cache:
+            return self._state.build_rollup(), None
+        variant = self._rollup_variant()
+        return (cache.get_cached_rollup(self.folder_path, fingerprint, self._state.build_rollup, variant),
+                cache.rollup_path(self.folder_path, fingerprint, variant))
+
+    def _rollup_variant(self):
+        """Return the part of the rollup cache key for the schema, exception tables and reports filter."""
+        variant = f"{'compact' if self.compact else 'full'}.{titles.get_normalizer().config_hash}"
+        if self.reports is not None:
+            variant += f".{'|'.join(sorted(self.reports))}"
+        return variant
+
+    def reload(self):
+        """Re-ingest changed workbooks and publish a new snapshot; returns True if the data changed."""
+        with self._lock:
+            return self._ingest()
+
+    def refresh(self):
+        """Reload only if the exports folder fingerprint changed; returns True if the data changed."""
+        if self._snapshot is None:
+            self.snapshot()
+            return True
+        if self.folder_fingerprint() == self.fingerprint:
+            return False
+        return self.reload()
+
+    def derived(self, key, build):
+        """Return the memoized result of build(snapshot) for key on the current snapshot."""
+        return self.snapshot().derived(key, build)
@@ -0,0 +1,86 @@
+import os
+import argparse
+import cache
+import data
+import queries
+
+
+# HELPER VARIABLES
+media_types = ['Film', 'TV']
+metric_choices = ['Views', 'Hours Viewed']
+grouping_choices = ['Media', 'Ownership']
+format_choices = ['parquet', 'csv', 'json']
+
+
+# HELPER FUNCTIONS
+def slug(name):
+    """Turn a media type, metric or grouping into a lowercase file name part."""
+    return name.lower().replace(' ', '_')
+
+
+def write_frame(df, folder, name, formats):
+    """Atomically write a frame as folder/name.<format> for each format and return the paths written."""
+    paths = []
+    for file_format in formats:
+        path = os.path.join(folder, f"{name}.{file_format}")
+        if file_format == 'parquet':
+            cache.write_atomic(path, lambda tmp_path: df.to_parquet(tmp_path, engine='pyarrow', index=False))
+        elif file_format == 'csv':
+            cache.write_atomic(path, lambda tmp_path: df.to_csv(tmp_path, index=False))
+        else:
+            cache.write_atomic(path, lambda tmp_path: df.to_json(tmp_path, orient='records', date_format='iso'))
+        paths.append(path)
+    return paths
+
+
+def leaderboard(dataset, media_type, metric, top):
+    """Return the top leaderboard rows for a metric with their rank as a column, or every row when top is None."""
+    n = top if top is not None else queries.count_top_n_titles(dataset, media_type, metric)
+    return queries.get_top_n_page(dataset, media_type, metric, n=n).rename_axis('Rank').reset_index()
+
+
+def export_tables(dataset, output_dir, formats, metric_names=metric_choices, groupings=grouping_choices, top=None):
+    """Write the leaderboards, fiscal half summaries and enriched title tables of a dataset; returns the paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    snapshot = dataset.snapshot()
+    paths = []
+    for media_type in media_types:
+        for metric in metric_names:
+            paths += write_frame(leaderboard(snapshot, media_type, metric, top), output_dir,
+                                 f"leaderboard_{slug(media_type)}_{slug(metric)}", formats)
+
+    for column_choice in groupings:
+        summary = queries.get_fiscal_half_summary(snapshot, column_choice).drop(columns='index', errors='ignore')
+        paths += write_frame(summary, output_dir, f"fiscal_half_{slug(column_choice)}", formats)
+
+    for media_type, titles in zip(media_types, [snapshot.film_data, snapshot.tv_data]):
+        paths += write_frame(titles.reset_index(drop=True), output_dir, f"titles_{slug(media_type)}", formats)
+    return paths
+
+
+def parse_args(argv=None):
+    """Parse the export command line."""
+    parser = argparse.ArgumentParser(description='Export leaderboards, fiscal half summaries and enriched title '
+                                                 'tables without starting the dashboard.')
+    parser.add_argument('folder', nargs='?', default='exports', help='folder of Excel exports (default: exports)')
+    parser.add_argument('--output-dir', default='batch_output', help='folder to write the tables to')
+    parser.add_argument('--format', nargs='+', choices=format_choices, default=['parquet'], dest='formats',
+                        help='one or more output formats (default: parquet)')
+    parser.add_argument('--reports', nargs='+', metavar='PATTERN',
+                        help='only ingest workbooks whose file names match these patterns, e.g. "*2024*"')
+    parser.add_argument('--metrics', nargs='+', choices=metric_choices, default=metric_choices,
+                        help='leaderboard metrics to export (default: both)')
+    parser.add_argument('--groupings', nargs='+', choices=grouping_choices, default=grouping_choices,
+                        help='fiscal half summary groupings to export (default: both)')
+    parser.add_argument('--top', type=int, help='leaderboard rows per metric (default: every title)')
+    parser.add_argument('--jobs', type=int, help='processes used to parse workbooks (default: INGESTION_WORKERS)')
+    parser.add_argument('--no-cache', action='store_true', help='parse every workbook instead of using .cache')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    dataset = data.ViewershipDataset(args.folder, use_cache=not args.no_cache,
+                                     max_workers=args.jobs or data.ingestion_workers, reports=args.reports)
+    for path in export_tables(dataset, args.output_dir, args.formats, args.metrics, args.groupings, args.top):
+        print(path)
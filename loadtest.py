@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+import data
+import metrics
+import queries
+
+
+# Sessions share one dataset snapshot in this process, as in main.py
+pd.set_option('mode.copy_on_write', True)
+
+
+# HELPER VARIABLES
+page_size = 10
+
+# Widgets a simulated user changes between reruns, by key, with the values it picks from
+interactions = [
+    ('top_films_choice', ['Views', 'Hours Viewed']),
+    ('top_tv_choice', ['Views', 'Hours Viewed']),
+    ('column_choice', ['Media', 'Ownership']),
+    ('trend_media', ['Film', 'TV']),
+    ('trend_level', ['Group Title', 'Title']),
+    ('trend_metric', ['Views', 'Hours Viewed']),
+    ('trend_view', queries.trend_views)
+]
+default_widgets = {key: options[0] for key, options in interactions}
+
+
+# HELPER FUNCTIONS
+def rerun_queries(dataset, widgets):
+    """Make the data queries main.py makes on one rerun with the given widget values."""
+    snapshot = dataset.snapshot()
+    for media_type, metric in [('Film', widgets['top_films_choice']), ('TV', widgets['top_tv_choice'])]:
+        queries.get_grouped_data(snapshot, media_type)
+        queries.count_top_n_titles(snapshot, media_type, metric)
+        queries.get_top_n_page(snapshot, media_type, metric, n=page_size)
+
+    queries.get_fiscal_half_render(snapshot, widgets['column_choice'])
+
+    media_type, level, metric = widgets['trend_media'], widgets['trend_level'], widgets['trend_metric']
+    rising_titles = queries.get_rising_titles(snapshot, media_type, level, metric)
+    queries.get_trend_leaders(snapshot, media_type, level, metric)
+    queries.get_title_trends(snapshot, level, metric, rising_titles[level].head(5).tolist(), widgets['trend_view'])
+    queries.get_decay_curves(snapshot, level, metric)
+
+
+def timed(func):
+    """Call func and return its wall time in milliseconds."""
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def simulate_session(dataset, reruns, seed):
+    """Run one session's queries, then rerun them with a random widget change each time.
+
+    Returns the latency of the first run and of each following rerun, in milliseconds.
+    """
+    rng = random.Random(seed)
+    widgets = dict(default_widgets)
+    first_run = timed(lambda: rerun_queries(dataset, widgets))
+
+    rerun_latencies = []
+    for _ in range(reruns):
+        key, options = rng.choice(interactions)
+        widgets[key] = rng.choice(options)
+        rerun_latencies.append(timed(lambda: rerun_queries(dataset, widgets)))
+    return first_run, rerun_latencies
+
+
+def timed_app_run(app, timeout):
+    """Rerun an AppTest script and return its wall time in milliseconds, raising if the script failed."""
+    wall_ms = timed(lambda: app.run(timeout=timeout))
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return wall_ms
+
+
+def simulate_app_sessions(script, sessions, reruns, seed, timeout):
+    """Run whole-script sessions through AppTest, taking turns on one thread since AppTest is not thread-safe.
+
+    Returns (first run, rerun latencies) per session, in milliseconds.
+    """
+    rng = random.Random(seed)
+    apps = [AppTest.from_file(script, default_timeout=timeout) for _ in range(sessions)]
+    results = [(timed_app_run(app, timeout), []) for app in apps]
+    for _ in range(reruns):
+        for app, (_, rerun_latencies) in zip(apps, results):
+            key, options = rng.choice(interactions)
+            app.selectbox(key=key).set_value(rng.choice(options))
+            rerun_latencies.append(timed_app_run(app, timeout))
+    return results
+
+
+def summarize(latencies):
+    """Return the count, mean, p50, p90, p99 and max of latencies in milliseconds."""
+    if not latencies:
+        return {'count': 0}
+    values = np.asarray(latencies)
+    return {
+        'count': len(values),
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p90_ms': round(float(np.percentile(values, 90)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+
+# LOAD TEST
+def run_load_test(sessions=16, reruns=20, seed=0, app_script=None, timeout=120):
+    """Run simulated sessions against one shared dataset and return the latency report.
+
+    Sessions run concurrently on threads and make main.py's queries on every rerun. With app_script,
+    whole Streamlit script runs are measured instead, with sessions taking turns. A warm-up run loads
+    the dataset first, so the report measures serving rather than ingestion.
+    """
+    if app_script is None:
+        dataset = data.ViewershipDataset(data.folder_path)
+        warmup_ms = timed(lambda: rerun_queries(dataset, default_widgets))
+    else:
+        warmup_ms = timed_app_run(AppTest.from_file(app_script, default_timeout=timeout), timeout)
+    rss_before = metrics.current_rss()
+
+    start = time.perf_counter()
+    if app_script is None:
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            results = list(executor.map(lambda i: simulate_session(dataset, reruns, seed + i), range(sessions)))
+    else:
+        results = simulate_app_sessions(app_script, sessions, reruns, seed, timeout)
+    elapsed = time.perf_counter() - start
+
+    rss_after = metrics.current_rss()
+    rerun_latencies = [latency for _, latencies in results for latency in latencies]
+    return {
+        'mode': 'queries' if app_script is None else 'app',
+        'sessions': sessions,
+        'reruns_per_session': reruns,
+        'warmup_ms': round(warmup_ms, 3),
+        'first_run': summarize([first_run for first_run, _ in results]),
+        'rerun': summarize(rerun_latencies),
+        'reruns_per_second': round(len(rerun_latencies) / elapsed, 3),
+        'memory_delta_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate concurrent dashboard sessions and report rerun latency.')
+    parser.add_argument('--app', nargs='?', const='main.py', metavar='SCRIPT',
+                        help='measure whole runs of a Streamlit script (default: main.py) instead of its queries')
+    parser.add_argument('--sessions', type=int, default=16, help='concurrent simulated sessions')
+    parser.add_argument('--reruns', type=int, default=20, help='widget-driven reruns per session')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the simulated widget changes')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds a single --app run may take')
+    parser.add_argument('--output', default='loadtest_results.json', help='path of the JSON results file')
+    args = parser.parse_args()
+
+    report = run_load_test(args.sessions, args.reruns, args.seed, args.app, args.timeout)
+    results = {'generated_at': datetime.now(timezone.utc).isoformat(), 'folder': os.path.abspath(data.folder_path),
+               **report}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(report, indent=2))
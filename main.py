@@ -1,11 +1,21 @@
 import streamlit as st
+import pandas as pd
 
 import data
 import queries
-from datetime import datetime
+import metrics
+import watcher
+import logging
 import os
 
 
+# Stage timings are logged as JSON lines at INFO level
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'WARNING'))
+
+# Every session reads the same dataset snapshot, so slices are views and any write copies instead of mutating it
+pd.set_option('mode.copy_on_write', True)
+
+
 # HEADER
 st.set_page_config(page_title='Netflix Viewership Dashboard', layout='wide')
 
@@ -25,12 +35,42 @@ st.write('')
 st.write('')
 
 
+# DATA
+@st.cache_resource
+def get_dataset():
+    """Share one lazily loaded dataset across all Streamlit sessions, reloaded in the background on changes.
+
+    Returns the dataset and whether the watcher started; without it, reruns fall back to refresh().
+    """
+    dataset = data.ViewershipDataset(data.folder_path)
+    try:
+        watcher.ExportsWatcher(dataset).start()
+    except OSError:
+        # e.g. the inotify watch limit is reached
+        logging.getLogger('netflix_viewership.watcher').exception("Watching %s failed", data.folder_path)
+        return dataset, False
+    return dataset, True
+
+
+shared_dataset, watching = get_dataset()
+if not watching:
+    shared_dataset.refresh()
+
+# Pin one snapshot for the whole rerun; the watcher swaps in new versions without a folder scan per rerun
+dataset = shared_dataset.snapshot()
+
+film_data_grouped = queries.get_grouped_data(dataset, 'Film')
+tv_data_grouped = queries.get_grouped_data(dataset, 'TV')
+
+
 # VISUALIZATION #1 - Most Viewed Films and TV Shows
+page_size = 10  # Leaderboard rows sent to the browser per page
+
 col1, col2 = st.columns(2)
 
 with col1:
     st.markdown('### Most Viewed Films 📽️')
-    col_a, col_b, _ = st.columns([2, 2, 2])
+    col_a, col_b, col_c = st.columns([2, 2, 2])
 
     with col_a:
         top_films_choice = st.selectbox(
@@ -40,8 +80,8 @@ with col1:
         )
 
     with col_b:
-        max_films = queries.film_data_grouped['# of Films'].max()
-        min_films = queries.film_data_grouped['# of Films'].min()
+        max_films = film_data_grouped['# of Films'].max()
+        min_films = film_data_grouped['# of Films'].min()
         films_filter = st.select_slider(
             'Filter by # of Films:',
             options=list(range(min_films, int(max_films) + 1)),
@@ -49,12 +89,20 @@ with col1:
             key='films_filter'
         )
 
-    filtered_films = queries.film_data_grouped[queries.film_data_grouped['# of Films'].between(films_filter[0], films_filter[1])]
-    st.dataframe(queries.get_top_n_titles(filtered_films, 10, top_films_choice))
+    film_count = queries.count_top_n_titles(dataset, 'Film', top_films_choice, films_filter)
+    with col_c:
+        films_page = st.selectbox(
+            'Page:',
+            options=range(1, max(1, -(-film_count // page_size)) + 1),
+            key='films_page'
+        )
+
+    st.dataframe(queries.get_top_n_page(dataset, 'Film', top_films_choice, films_filter, page_size,
+                                        (films_page - 1) * page_size))
 
 with col2:
     st.markdown('### Most Viewed TV Shows 📺')
-    col_a, col_b, _ = st.columns([2, 2, 2])
+    col_a, col_b, col_c = st.columns([2, 2, 2])
 
     with col_a:
         top_tv_choice = st.selectbox(
@@ -64,8 +112,8 @@ with col2:
         )
 
     with col_b:
-        max_seasons = queries.tv_data_grouped['# of Seasons'].max()
-        min_seasons = queries.tv_data_grouped['# of Seasons'].min()
+        max_seasons = tv_data_grouped['# of Seasons'].max()
+        min_seasons = tv_data_grouped['# of Seasons'].min()
         seasons_filter = st.select_slider(
             'Filter by # of Seasons:',
             options=list(range(min_seasons, int(max_seasons) + 1)),
@@ -73,8 +121,16 @@ with col2:
             key='seasons_filter'
         )
 
-    filtered_tv = queries.tv_data_grouped[queries.tv_data_grouped['# of Seasons'].between(seasons_filter[0], seasons_filter[1])]
-    st.dataframe(queries.get_top_n_titles(filtered_tv, 10, top_tv_choice))
+    tv_count = queries.count_top_n_titles(dataset, 'TV', top_tv_choice, seasons_filter)
+    with col_c:
+        tv_page = st.selectbox(
+            'Page:',
+            options=range(1, max(1, -(-tv_count // page_size)) + 1),
+            key='tv_page'
+        )
+
+    st.dataframe(queries.get_top_n_page(dataset, 'TV', top_tv_choice, seasons_filter, page_size,
+                                        (tv_page - 1) * page_size))
 
 st.write('')
 st.write('')
@@ -86,28 +142,68 @@ col1, col2 = st.columns([1, 4])
 with col1:
     column_choice = st.selectbox(
         'Choose a grouping:',
-        options=['Media', 'Ownership']
+        options=['Media', 'Ownership'],
+        key='column_choice'
     )
 
-# Function to fetch the latest file modification timestamp from the 'exports' folder
-def get_latest_file_timestamp():
-    latest_time = datetime.min
-    for file_name in os.listdir(data.folder_path):
-        file_path = os.path.join(data.folder_path, file_name)
-        if os.path.isfile(file_path):
-            file_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-            if file_time > latest_time:
-                latest_time = file_time
-    return latest_time
-
-# Check if the 'exports' folder has a new file added
-latest_publish_time = get_latest_file_timestamp()
-
-# Create fiscal half chart (without caching)
+# Chart spec and data are serialized once per grouping until the exports change
 with st.spinner("Loading..."):
-    date_range_chart = queries.create_fiscal_half_chart(column_choice)
+    chart_data, chart_spec = queries.get_fiscal_half_render(dataset, column_choice)
+
+with metrics.stage('vega_lite_chart'):
+    st.vega_lite_chart(chart_data, chart_spec, use_container_width=True)
 
-st.altair_chart(date_range_chart, use_container_width=True)
+st.write('')
+
+
+# VISUALIZATION #3 - Trends Across Reporting Windows
+st.header('Trends Across Reporting Windows')
+col_a, col_b, col_c, col_d = st.columns(4)
+
+with col_a:
+    trend_media = st.selectbox('Media:', options=['Film', 'TV'], key='trend_media')
+
+with col_b:
+    trend_level = st.selectbox(
+        'Level:',
+        options=['Group Title', 'Title'],
+        format_func=lambda level: 'Grouped titles' if level == 'Group Title' else 'Individual titles',
+        key='trend_level'
+    )
+
+with col_c:
+    trend_metric = st.selectbox('Metric:', options=['Views', 'Hours Viewed'], key='trend_metric')
+
+with col_d:
+    trend_view = st.selectbox('View:', options=queries.trend_views, key='trend_view')
+
+col1, col2 = st.columns([2, 3])
+
+with col1:
+    st.markdown('**Rising in the latest half**')
+    rising_titles = queries.get_rising_titles(dataset, trend_media, trend_level, trend_metric)
+    st.dataframe(rising_titles)
+
+with col2:
+    # Pick from the rising titles and the biggest titles overall; listing every title would flood the browser
+    trend_options = list(dict.fromkeys(
+        rising_titles[trend_level].tolist() + queries.get_trend_leaders(dataset, trend_media, trend_level, trend_metric)
+    ))
+    trend_titles = st.multiselect(
+        'Titles:',
+        options=trend_options,
+        default=rising_titles[trend_level].head(5).tolist(),
+        key=f'trend_titles_{trend_media}_{trend_level}'
+    )
+    trend_data = queries.get_title_trends(dataset, trend_level, trend_metric, trend_titles, trend_view)
+    with metrics.stage('vega_lite_chart'):
+        st.vega_lite_chart(trend_data[trend_data['Media'] == trend_media],
+                           queries.build_trend_spec(trend_level, trend_metric), use_container_width=True)
+
+st.markdown('**Decay after the first report** (average share of the first half kept in later halves)')
+with metrics.stage('vega_lite_chart'):
+    st.vega_lite_chart(queries.get_decay_curves(dataset, trend_level, trend_metric), queries.build_decay_spec(),
+                       use_container_width=True)
 
 st.write('')
 
@@ -131,7 +227,7 @@ with col1:
         """
     )
 
-    st.dataframe(queries.excel_files_df, hide_index=True)
+    st.dataframe(queries.get_excel_files_df(dataset), hide_index=True)
 
     with st.expander("Expand to add new Netflix data"):
         uploaded_file = st.file_uploader("Choose an Excel file", type=["xlsx"])
@@ -145,7 +241,8 @@ with col1:
             else:
                 with open(file_path, "wb") as f:
                     f.write(uploaded_file.getbuffer())
-                st.success(f"File {file_name} has been uploaded successfully!")
+                st.success(f"File {file_name} has been uploaded successfully! The dashboard will include it "
+                           f"once it has been processed.")
 
     st.write('')
     st.write('')
@@ -166,3 +263,11 @@ with col1:
     titles with later datasets; if unavailable, the runtime is set to the average within the Media classification 
     ("Film" or "TV").
     """)
+
+
+# DIAGNOSTICS (hidden unless the page is opened with ?diagnostics=1)
+if st.query_params.get('diagnostics') == '1':
+    with st.expander("Diagnostics"):
+        st.dataframe(metrics.snapshot(), hide_index=True)
+        st.json(metrics.counters())
+        st.code(metrics.to_prometheus(), language='text')
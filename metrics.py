@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+import pandas as pd
+
+
+# HELPER VARIABLES
+logger = logging.getLogger('netflix_viewership.metrics')
+metric_prefix = 'netflix_viewership'
+
+_lock = threading.Lock()
+_stages = {}
+_counters = {}
+
+
+# HELPER FUNCTIONS
+def current_rss():
+    """Return the resident set size of this process in bytes, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def count_rows(result):
+    """Count the rows of a DataFrame result, or of every DataFrame in a tuple result."""
+    frames = result if isinstance(result, tuple) else (result,)
+    rows = [len(df) for df in frames if isinstance(df, pd.DataFrame)]
+    return sum(rows) if rows else None
+
+
+def record(name, wall_ms, rows=None, memory_delta=None):
+    """Add one measurement of a stage to the registry and emit it as a structured log line."""
+    with _lock:
+        stats = _stages.setdefault(name, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0})
+        stats['calls'] += 1
+        stats['total_ms'] += wall_ms
+        stats['max_ms'] = max(stats['max_ms'], wall_ms)
+        stats['last_ms'] = wall_ms
+        stats['rows'] += rows or 0
+        stats['last_memory_delta'] = memory_delta
+
+    logger.info(json.dumps({'stage': name, 'wall_ms': round(wall_ms, 3), 'rows': rows,
+                            'memory_delta_bytes': memory_delta}))
+
+
+def increment(name, value=1):
+    """Increase a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+# TIMERS
+@contextmanager
+def stage(name, rows=None):
+    """Time a block and record its wall time, RSS delta and rows.
+
+    The yielded dict can be updated with 'rows' once the block knows how many it processed.
+    """
+    info = {'rows': rows}
+    rss_before = current_rss()
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        wall_ms = (time.perf_counter() - start) * 1000
+        rss_after = current_rss()
+        memory_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        record(name, wall_ms, info['rows'], memory_delta)
+
+
+def timed(name):
+    """Decorate a function so every call is recorded as a stage, counting the rows it returns."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name) as info:
+                result = func(*args, **kwargs)
+                info['rows'] = count_rows(result)
+                return result
+        return wrapper
+    return decorator
+
+
+# EXPORT
+def snapshot():
+    """Return the recorded stages as a DataFrame, slowest total time first."""
+    with _lock:
+        rows = [{'Stage': name, **stats} for name, stats in _stages.items()]
+    if not rows:
+        return pd.DataFrame(columns=['Stage', 'calls', 'total_ms', 'max_ms', 'last_ms', 'rows', 'last_memory_delta'])
+    df = pd.DataFrame(rows)
+    df['avg_ms'] = df['total_ms'] / df['calls']
+    return df.sort_values('total_ms', ascending=False).reset_index(drop=True)
+
+
+def counters():
+    """Return a copy of the counters."""
+    with _lock:
+        return dict(_counters)
+
+
+def to_prometheus():
+    """Render stages and counters in the Prometheus text exposition format."""
+    with _lock:
+        stages = {name: dict(stats) for name, stats in _stages.items()}
+        counter_values = dict(_counters)
+
+    lines = []
+    for metric, key, help_text in [
+        ('stage_calls_total', 'calls', 'Number of times a stage ran.'),
+        ('stage_seconds_total', 'total_ms', 'Total wall time spent in a stage.'),
+        ('stage_seconds_max', 'max_ms', 'Slowest single run of a stage.'),
+        ('stage_rows_total', 'rows', 'Rows produced by a stage.')
+    ]:
+        name = f"{metric_prefix}_{metric}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {'gauge' if key == 'max_ms' else 'counter'}"]
+        for stage_name, stats in stages.items():
+            value = stats[key] / 1000 if key.endswith('_ms') else stats[key]
+            lines.append(f'{name}{{stage="{stage_name}"}} {value}')
+
+    for counter_name, value in counter_values.items():
+        name = f"{metric_prefix}_{counter_name}_total"
+        lines += [f"# TYPE {name} counter", f"{name} {value}"]
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    """Forget every recorded stage and counter."""
+    with _lock:
+        _stages.clear()
+        _counters.clear()
@@ -1,166 +1,368 @@
-import pandas as pd
-import altair as alt
-import os
-import streamlit as st
-import data
-
-
-# FILE UPLOAD
-excel_files = [file for file in os.listdir(data.folder_path) if file.endswith('.xlsx')]
-excel_files.sort(reverse=True)
-excel_files_df = pd.DataFrame(excel_files, columns=['Excel Files In Use'])
-
-
-# VISUALIZATION #1
-def combine_windows(df):
-    """Aggregate data for films or TV shows."""
-    aggregated = df.groupby(
-        ['Group Title', 'Title', 'Release Date', 'Runtime in Minutes'],
-        as_index=False).agg({'Hours Viewed': 'sum', 'Start Date': 'min', 'End Date': 'max'})
-
-    aggregated['Views'] = (aggregated['Hours Viewed'] / (aggregated['Runtime in Minutes'] / 60)).round()
-
-    return aggregated
-
-def group_and_aggregate(df):
-    """Group by 'Group Title' and aggregate values."""
-    return df.groupby(['Group Title'], as_index=False).agg(
-        {
-            'Views': 'sum',
-            'Hours Viewed': 'sum',
-            'Title': 'nunique',
-            'Runtime in Minutes': 'mean'
-        }
-    )
-
-
-def rename_columns(df, media_type):
-    """Rename columns based on media type ('Film' or 'TV')."""
-    if media_type == 'Film':
-        return df.rename(columns={
-            'Group Title': 'Title',
-            'Runtime in Minutes': 'Avg Runtime (min)',
-            'Title': '# of Films'
-        })
-    elif media_type == 'TV':
-        return df.rename(columns={
-            'Group Title': 'Series Title',
-            'Runtime in Minutes': 'Avg Runtime (min)',
-            'Title': '# of Seasons'
-        })
-
-
-def get_top_n_titles(df, n, metric='Views', filter_by_count=None):
-    """Get and format the top N titles based on the chosen filters."""
-    if filter_by_count is not None:
-        column_name = '# of Films' if 'Films' in df.columns else '# of Seasons'
-        df = df[df[column_name] <= filter_by_count]
-
-    top_titles = df.nlargest(n, metric)
-    top_titles[metric] = top_titles[metric].round(-5)
-    top_titles['Avg Runtime (min)'] = top_titles['Avg Runtime (min)'].round(0)
-    top_titles.reset_index(drop=True, inplace=True)
-    top_titles.index += 1
-    return top_titles
-
-
-combined_window_films = combine_windows(data.film_data)
-combined_window_tv = combine_windows(data.tv_data)
-
-film_data_grouped = group_and_aggregate(combined_window_films)
-film_data_grouped = rename_columns(film_data_grouped, 'Film')
-
-tv_data_grouped = group_and_aggregate(combined_window_tv)
-tv_data_grouped = rename_columns(tv_data_grouped, 'TV')
-
-top_10_tv = get_top_n_titles(tv_data_grouped, 10)
-top_10_films = get_top_n_titles(film_data_grouped, 10)
-
-
-# VISUALIZATION #2
-def get_fiscal_half(start_date, end_date):
-    """Create a Fiscal Half column in the format H1 YYYY or H2 YYYY."""
-    start_year = start_date.year
-    if 1 <= start_date.month <= 6:
-        return f"H1 {start_year}"
-    else:
-        return f"H2 {start_year}"
-
-
-def get_latest_publish_time():
-    """Get the latest publish time from the data to check for updates."""
-    # Assuming 'data.film_data' and 'data.tv_data' have a 'Start Date' column
-    latest_film_time = data.film_data['Start Date'].max()
-    latest_tv_time = data.tv_data['Start Date'].max()
-    return max(latest_film_time, latest_tv_time)
-
-
-def add_fiscal_half_and_views(df, media_type, latest_publish_time):
-    """Add Media, Fiscal Half columns and calculate Views based on Hours Viewed and Runtime."""
-    df['Media'] = media_type
-    df['Fiscal Half'] = df.apply(
-        lambda row: get_fiscal_half(pd.to_datetime(row['Start Date']), pd.to_datetime(row['End Date'])),
-        axis=1
-    )
-    df['Views'] = (df['Hours Viewed'] / (df['Runtime in Minutes'] / 60)).round()
-    return df
-
-
-def create_fiscal_half_chart(column_choice):
-    """Create and return the fiscal half chart."""
-    # Get latest data publish time to ensure proper cache invalidation
-    latest_publish_time = get_latest_publish_time()
-
-    # Prepare data with chosen column
-    film_data_with_fiscal_half = add_fiscal_half_and_views(data.film_data, 'Film', latest_publish_time)
-    tv_data_with_fiscal_half = add_fiscal_half_and_views(data.tv_data, 'TV', latest_publish_time)
-
-    combined_data = pd.concat([film_data_with_fiscal_half, tv_data_with_fiscal_half])
-
-    fiscal_half_summary = combined_data.groupby([column_choice, 'Fiscal Half', 'Start Date'], as_index=False)[
-        'Views'].sum()
-
-    fiscal_half_summary = fiscal_half_summary.sort_values(by='Start Date').reset_index()
-    fiscal_half_summary['Views in Billions'] = fiscal_half_summary['Views'] / 1_000_000_000
-    fiscal_half_summary['Text Label'] = (fiscal_half_summary['Views in Billions'].round(2).astype(str) + 'B')
-
-    # Chart settings
-    sort_order = fiscal_half_summary[['Fiscal Half', 'Start Date']].drop_duplicates().sort_values('Start Date').drop(
-        columns='Start Date').values.flatten().tolist()
-
-    if column_choice == 'Media':
-        domain = ['Film', 'TV']
-        range_ = ['#E50914', '#000000']
-    elif column_choice == 'Ownership':
-        domain = ['Original', 'Licensed']
-        range_ = ['#B1060F', '#564d4d']
-
-    color_scale = alt.Scale(domain=domain, range=range_)
-
-    fiscal_half_chart = alt.Chart(fiscal_half_summary).mark_bar().encode(
-        x=alt.X('Fiscal Half:N', axis=alt.Axis(labelAngle=0), sort=sort_order),
-        y='Views:Q',
-        xOffset=f'{column_choice}:N',
-        color=alt.Color(f'{column_choice}:N', scale=color_scale)
-    )
-
-    text_labels = fiscal_half_chart.mark_text(
-        baseline='middle',
-        dy=-10,
-        fontSize=14
-    ).encode(
-        text='Text Label:N'
-    )
-
-    # Final chart configuration
-    fiscal_half_chart = (fiscal_half_chart + text_labels).configure_mark(
-        opacity=0.8
-    ).configure_axis(
-        labelFontSize=16,
-        titleFontSize=0,
-        grid=False
-    ).configure_axisY(
-        labelFontSize=0
-    )
-
-    return fiscal_half_chart
+import pandas as pd
+import numpy as np
+import os
+import metrics
+import sql_backend
+import trends
+
+
+# HELPER VARIABLES
+# 'pandas' aggregates the in-memory rollup cube; 'duckdb' pushes the aggregations down to the Parquet cube, and
+# ViewershipDataset then keeps its frames on disk (see data.out_of_core)
+query_backend = os.environ.get('QUERY_BACKEND', 'pandas')
+
+
+# FILE UPLOAD
+def get_excel_files_df(dataset):
+    """List the Excel files a dataset snapshot was ingested from, newest report first, without scanning the folder."""
+    excel_files = sorted((name for name, _, _ in dataset.fingerprint or ()), reverse=True)
+    return pd.DataFrame(excel_files, columns=['Excel Files In Use'])
+
+
+# VISUALIZATION #1
+def slice_rollup(rollup, **filters):
+    """Select the cells of the rollup cube matching every column=value filter."""
+    mask = np.ones(len(rollup), dtype=bool)
+    for col, value in filters.items():
+        mask &= (rollup[col] == value).to_numpy()
+    return rollup[mask]
+
+
+@metrics.timed('combine_windows')
+def combine_windows(df):
+    """Aggregate data for films or TV shows across reporting windows."""
+    aggregated = df.groupby(
+        ['Group Title', 'Title', 'Release Date', 'Runtime in Minutes'],
+        as_index=False, observed=True).agg({'Hours Viewed': 'sum', 'Start Date': 'min', 'End Date': 'max'})
+
+    aggregated['Views'] = (aggregated['Hours Viewed'] / (aggregated['Runtime in Minutes'] / 60)).round()
+
+    return aggregated
+
+@metrics.timed('group_and_aggregate')
+def group_and_aggregate(df):
+    """Group by 'Group Title' and aggregate values."""
+    return df.groupby(['Group Title'], as_index=False, observed=True).agg(
+        {
+            'Views': 'sum',
+            'Hours Viewed': 'sum',
+            'Title': 'nunique',
+            'Runtime in Minutes': 'mean'
+        }
+    )
+
+
+def rename_columns(df, media_type):
+    """Rename columns based on media type ('Film' or 'TV')."""
+    if media_type == 'Film':
+        return df.rename(columns={
+            'Group Title': 'Title',
+            'Runtime in Minutes': 'Avg Runtime (min)',
+            'Title': '# of Films'
+        })
+    elif media_type == 'TV':
+        return df.rename(columns={
+            'Group Title': 'Series Title',
+            'Runtime in Minutes': 'Avg Runtime (min)',
+            'Title': '# of Seasons'
+        })
+
+
+def format_top_titles(top_titles, metric, start=1):
+    """Round the metric and runtime for display and number rows from start."""
+    # Only the rounded columns are copied; the rest stay views of the shared leaderboard
+    top_titles = top_titles.assign(**{
+        metric: top_titles[metric].round(-5),
+        'Avg Runtime (min)': top_titles['Avg Runtime (min)'].round(0)
+    }).reset_index(drop=True)
+    top_titles.index += start
+    return top_titles
+
+
+def get_top_n_titles(df, n, metric='Views', filter_by_count=None):
+    """Get and format the top N titles based on the chosen filters."""
+    if filter_by_count is not None:
+        column_name = '# of Films' if '# of Films' in df.columns else '# of Seasons'
+        df = df[df[column_name] <= filter_by_count]
+
+    return format_top_titles(df.nlargest(n, metric), metric)
+
+
+class TopNIndex:
+    """Leaderboard positions pre-sorted by each metric within each '# of Films'/'# of Seasons' partition.
+
+    A top-N query over a count range only looks at the first offset + n rows of every partition in range.
+    """
+
+    @metrics.timed('top_n_index')
+    def __init__(self, grouped, metric_names=('Views', 'Hours Viewed')):
+        self.grouped = grouped.reset_index(drop=True)
+        self.count_column = '# of Films' if '# of Films' in grouped.columns else '# of Seasons'
+        self.partitions = {metric: self.build_partitions(metric) for metric in metric_names}
+
+    def build_partitions(self, metric):
+        """Map each count to its row positions and values, sorted by descending metric."""
+        values = self.grouped[metric].to_numpy(dtype=float)
+        counts = self.grouped[self.count_column].to_numpy()
+        order = np.lexsort((np.arange(len(values)), -values, counts))
+        order = order[~np.isnan(values[order])]
+
+        partitions = {}
+        boundaries = np.flatnonzero(np.diff(counts[order])) + 1
+        for positions in np.split(order, boundaries):
+            if len(positions):
+                partitions[counts[positions[0]]] = (positions, values[positions])
+        return partitions
+
+    def size(self, metric='Views', count_range=None):
+        """Return the number of ranked rows for a metric within an inclusive count range."""
+        low, high = count_range if count_range is not None else (-np.inf, np.inf)
+        return sum(len(positions) for count, (positions, _) in self.partitions[metric].items() if low <= count <= high)
+
+    @metrics.timed('top_n_query')
+    def top_n(self, metric='Views', count_range=None, n=10, offset=0):
+        """Return page [offset, offset + n) of the leaderboard for a metric within an inclusive count range."""
+        low, high = count_range if count_range is not None else (-np.inf, np.inf)
+        limit = offset + n
+        heads = [(positions[:limit], values[:limit]) for count, (positions, values) in self.partitions[metric].items()
+                 if low <= count <= high]
+        if not heads:
+            return format_top_titles(self.grouped.iloc[:0], metric, offset + 1)
+
+        positions = np.concatenate([head[0] for head in heads])
+        values = np.concatenate([head[1] for head in heads])
+        page = positions[np.lexsort((positions, -values))][offset:limit]
+        return format_top_titles(self.grouped.iloc[page], metric, offset + 1)
+
+
+def get_grouped_data(dataset, media_type):
+    """Return the memoized per-title leaderboard frame for 'Film' or 'TV'."""
+    def build(dataset):
+        if query_backend == 'duckdb':
+            return rename_columns(sql_backend.grouped_data(dataset, media_type), media_type)
+        df = slice_rollup(dataset.rollup, Media=media_type)
+        return rename_columns(group_and_aggregate(combine_windows(df)), media_type)
+
+    return dataset.derived(('grouped', media_type), build)
+
+
+def get_top_n_index(dataset, media_type):
+    """Return the memoized top-N index over the leaderboard frame for 'Film' or 'TV'."""
+    return dataset.derived(('top_n_index', media_type),
+                           lambda dataset: TopNIndex(get_grouped_data(dataset, media_type)))
+
+
+def get_top_n_page(dataset, media_type, metric='Views', count_range=None, n=10, offset=0):
+    """Return page [offset, offset + n) of the 'Film' or 'TV' leaderboard from the configured backend."""
+    if query_backend == 'duckdb':
+        top_titles = rename_columns(sql_backend.top_n_titles(dataset, media_type, metric, count_range, n, offset),
+                                    media_type)
+        return format_top_titles(top_titles, metric, offset + 1)
+    return get_top_n_index(dataset, media_type).top_n(metric, count_range, n, offset)
+
+
+def count_top_n_titles(dataset, media_type, metric='Views', count_range=None):
+    """Return the number of ranked titles in the 'Film' or 'TV' leaderboard within a count range."""
+    if query_backend == 'duckdb':
+        return sql_backend.count_titles(dataset, media_type, metric, count_range)
+    return get_top_n_index(dataset, media_type).size(metric, count_range)
+
+
+# VISUALIZATION #2
+def get_fiscal_half(start_date, end_date):
+    """Create a Fiscal Half column in the format H1 YYYY or H2 YYYY."""
+    start_year = start_date.year
+    if 1 <= start_date.month <= 6:
+        return f"H1 {start_year}"
+    else:
+        return f"H2 {start_year}"
+
+
+@metrics.timed('fiscal_half_summary')
+def build_fiscal_half_summary(dataset, column_choice):
+    """Sum views per fiscal half for the chosen grouping column."""
+    if query_backend == 'duckdb':
+        fiscal_half_summary = sql_backend.fiscal_half_summary(dataset, column_choice)
+    else:
+        fiscal_half_summary = dataset.rollup.groupby([column_choice, 'Fiscal Half', 'Start Date'], as_index=False,
+                                                     observed=True)['Views'].sum()
+
+    fiscal_half_summary = fiscal_half_summary.sort_values(by='Start Date').reset_index()
+    fiscal_half_summary['Views in Billions'] = fiscal_half_summary['Views'] / 1_000_000_000
+    fiscal_half_summary['Text Label'] = (fiscal_half_summary['Views in Billions'].round(2).astype(str) + 'B')
+    return fiscal_half_summary
+
+
+def get_fiscal_half_summary(dataset, column_choice):
+    """Return the memoized fiscal half summary; dropped whenever the dataset reloads."""
+    return dataset.derived(('fiscal_half_summary', column_choice),
+                           lambda dataset: build_fiscal_half_summary(dataset, column_choice))
+
+
+@metrics.timed('fiscal_half_chart')
+def build_fiscal_half_chart(dataset, column_choice):
+    """Build the fiscal half chart from the memoized summary."""
+    # altair is only needed to render, so headless exports never import it
+    import altair as alt
+
+    fiscal_half_summary = get_fiscal_half_summary(dataset, column_choice)
+
+    # Chart settings
+    sort_order = fiscal_half_summary[['Fiscal Half', 'Start Date']].drop_duplicates().sort_values('Start Date').drop(
+        columns='Start Date').values.flatten().tolist()
+
+    if column_choice == 'Media':
+        domain = ['Film', 'TV']
+        range_ = ['#E50914', '#000000']
+    elif column_choice == 'Ownership':
+        domain = ['Original', 'Licensed']
+        range_ = ['#B1060F', '#564d4d']
+
+    color_scale = alt.Scale(domain=domain, range=range_)
+
+    fiscal_half_chart = alt.Chart(fiscal_half_summary).mark_bar().encode(
+        x=alt.X('Fiscal Half:N', axis=alt.Axis(labelAngle=0), sort=sort_order),
+        y='Views:Q',
+        xOffset=f'{column_choice}:N',
+        color=alt.Color(f'{column_choice}:N', scale=color_scale)
+    )
+
+    text_labels = fiscal_half_chart.mark_text(
+        baseline='middle',
+        dy=-10,
+        fontSize=14
+    ).encode(
+        text='Text Label:N'
+    )
+
+    # Final chart configuration
+    fiscal_half_chart = (fiscal_half_chart + text_labels).configure_mark(
+        opacity=0.8
+    ).configure_axis(
+        labelFontSize=16,
+        titleFontSize=0,
+        grid=False
+    ).configure_axisY(
+        labelFontSize=0
+    )
+
+    return fiscal_half_chart
+
+
+# RENDERING
+def build_fiscal_half_render(dataset, column_choice):
+    """Pre-serialize the fiscal half chart as a Vega-Lite spec without inline data, plus the trimmed data it plots.
+
+    The data is sent separately so Streamlit ships it as an Arrow dataset, and only the columns the
+    chart encodes are kept.
+    """
+    spec = build_fiscal_half_chart(dataset, column_choice).to_dict()
+    for key in ('data', 'datasets'):
+        spec.pop(key, None)
+
+    chart_data = get_fiscal_half_summary(dataset, column_choice)[[column_choice, 'Fiscal Half', 'Views', 'Text Label']]
+    chart_data = chart_data.astype({column_choice: str, 'Fiscal Half': str}).reset_index(drop=True)
+    return chart_data, spec
+
+
+def get_fiscal_half_render(dataset, column_choice):
+    """Return the memoized (data, spec) pair for the fiscal half chart, shared across sessions."""
+    return dataset.derived(('fiscal_half_render', column_choice),
+                           lambda dataset: build_fiscal_half_render(dataset, column_choice))
+
+
+# VISUALIZATION #3
+trend_views = ['Per Half', 'Rolling Sum (2 Halves)', 'Half-over-Half Change']
+
+
+def get_trend_matrix(dataset, level='Group Title', metric='Views'):
+    """Return the memoized title x reporting window matrix for 'Group Title' or 'Title' rows."""
+    def build(dataset):
+        if query_backend == 'duckdb':
+            return trends.TrendMatrix(None, level, metric, cells=sql_backend.trend_cells(dataset, level, metric))
+        return trends.TrendMatrix(dataset.rollup, level, metric)
+
+    return dataset.derived(('trend_matrix', level, metric), build)
+
+
+def build_trend_values(dataset, level, metric, view):
+    """Compute a trend view over every row of the matrix at once."""
+    matrix = get_trend_matrix(dataset, level, metric)
+    if view == 'Rolling Sum (2 Halves)':
+        return matrix.rolling(2)
+    if view == 'Half-over-Half Change':
+        return matrix.deltas(1)
+    return matrix.values
+
+
+def get_title_trends(dataset, level, metric, names, view='Per Half'):
+    """Return the chosen trend view of the named titles in long form, one row per title and fiscal half."""
+    matrix = get_trend_matrix(dataset, level, metric)
+    values = dataset.derived(('trend_values', level, metric, view),
+                             lambda dataset: build_trend_values(dataset, level, metric, view))
+    return matrix.series(values, matrix.rows(names=names))
+
+
+def get_trend_leaders(dataset, media_type, level, metric, n=500):
+    """Return the memoized names of the n titles with the highest total metric, for the title picker."""
+    return dataset.derived(('trend_leaders', media_type, level, metric, n),
+                           lambda dataset: get_trend_matrix(dataset, level, metric).leaders(n, media_type))
+
+
+def build_rising_titles(dataset, media_type, level, metric, n):
+    """Tabulate the titles that gained the most in the latest fiscal half, rounded for display."""
+    rising = get_trend_matrix(dataset, level, metric).rising(n, media_type)
+    for col in [f'Previous {metric}', metric, 'Change']:
+        rising[col] = rising[col].round(-5)
+    rising['Change %'] = (rising['Change %'] * 100).round(1)
+    rising.index += 1
+    return rising.drop(columns='Media')
+
+
+def get_rising_titles(dataset, media_type, level, metric, n=10):
+    """Return the memoized rising titles table for the latest fiscal half."""
+    return dataset.derived(('rising_titles', media_type, level, metric, n),
+                           lambda dataset: build_rising_titles(dataset, media_type, level, metric, n))
+
+
+def build_decay_curves(dataset, level, metric):
+    """Average decay curve of Film and TV titles, as the share of first-half metric kept in later halves."""
+    matrix = get_trend_matrix(dataset, level, metric)
+    curves = [matrix.decay_curve(media_type).assign(Media=media_type) for media_type in ['Film', 'TV']]
+    return pd.concat(curves, ignore_index=True)
+
+
+def get_decay_curves(dataset, level, metric):
+    """Return the memoized Film and TV decay curves."""
+    return dataset.derived(('decay_curves', level, metric),
+                           lambda dataset: build_decay_curves(dataset, level, metric))
+
+
+def build_trend_spec(level, metric):
+    """Vega-Lite spec of one line per title across fiscal halves, with the data sent separately."""
+    return {
+        'mark': {'type': 'line', 'point': True},
+        'encoding': {
+            'x': {'field': 'Fiscal Half', 'type': 'ordinal', 'sort': {'field': 'Start Date', 'op': 'min'},
+                  'axis': {'labelAngle': 0, 'title': None}},
+            'y': {'field': metric, 'type': 'quantitative', 'axis': {'format': '~s', 'title': None}},
+            'color': {'field': level, 'type': 'nominal', 'legend': {'orient': 'bottom', 'title': None}},
+            'tooltip': [{'field': level, 'type': 'nominal'}, {'field': 'Fiscal Half', 'type': 'ordinal'},
+                        {'field': metric, 'type': 'quantitative', 'format': ','}]
+        }
+    }
+
+
+def build_decay_spec():
+    """Vega-Lite spec of the Film and TV decay curves, with the data sent separately."""
+    return {
+        'mark': {'type': 'line', 'point': True},
+        'encoding': {
+            'x': {'field': 'Windows Since First Report', 'type': 'ordinal', 'axis': {'labelAngle': 0}},
+            'y': {'field': 'Share of First Window', 'type': 'quantitative', 'axis': {'format': '%'}},
+            'color': {'field': 'Media', 'type': 'nominal', 'scale': {'domain': ['Film', 'TV'],
+                                                                     'range': ['#E50914', '#000000']}},
+            'tooltip': [{'field': 'Media', 'type': 'nominal'}, {'field': 'Titles', 'type': 'quantitative'},
+                        {'field': 'Share of First Window', 'type': 'quantitative', 'format': '.1%'}]
+        }
+    }
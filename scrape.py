@@ -1,66 +1,208 @@
 import os
-import requests
+import json
+import asyncio
+from email.utils import formatdate
+from urllib.parse import urljoin
+import aiohttp
 from bs4 import BeautifulSoup
 import pandas as pd
+import cache
 
 
-def scrape_netflix_articles(url="https://about.netflix.com/en/newsroom?search=what%2520we%2520watched", exports_folder='exports'):
-    # Create the exports directory if it doesn't exist
-    os.makedirs(exports_folder, exist_ok=True)
+# HELPER VARIABLES
+newsroom_url = "https://about.netflix.com/en/newsroom?search=what%2520we%2520watched"
+
+# Set headers to mimic a browser
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36'
+}
+
+# Download validators (ETag / Last-Modified) per Excel link, kept next to the exports
+state_filename = '.downloads.json'
+chunk_size = 1 << 16
 
-    # Set headers to mimic a browser
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36'
-    }
 
-    # Send a GET request to the URL
-    response = requests.get(url, headers=headers)
+# HELPER FUNCTIONS
+def load_download_state(exports_folder):
+    """Read the saved ETag and Last-Modified validators for previously downloaded files."""
+    try:
+        with open(os.path.join(exports_folder, state_filename), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-    # Check if the request was successful
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        articles = soup.find_all('div', {'data-testid': 'Article'})
 
-        # Initialize a list to store article data
-        articles_data = []
-    return soup
+def save_download_state(exports_folder, state):
+    """Atomically write the download validators."""
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+
+    cache.write_atomic(os.path.join(exports_folder, state_filename), write)
+
+
+def conditional_headers(file_path, validators):
+    """Build If-None-Match / If-Modified-Since headers for a file that is already on disk."""
+    if not os.path.exists(file_path):
+        return {}
+    if validators.get('etag'):
+        return {'If-None-Match': validators['etag']}
+    last_modified = validators.get('last_modified') or formatdate(os.path.getmtime(file_path), usegmt=True)
+    return {'If-Modified-Since': last_modified}
 
 
-def fetch_article_data(article_link, headers, date_tag, exports_folder):
-    """Fetch data from the individual article link."""
-    article_response = requests.get(article_link, headers=headers)
-    if article_response.status_code == 200:
-        article_soup = BeautifulSoup(article_response.text, 'html.parser')
-        all_links = article_soup.find_all('a')
+def resume_headers(part_path, validators):
+    """Build Range / If-Range headers to resume a partial download, discarding partials that cannot be resumed.
 
-        for link in all_links:
-            if link.get('href') and '.xlsx' in link['href'] and link.string == "here":
-                return download_excel_file(link['href'], date_tag, article_link, exports_folder)
+    If-Range needs the strong ETag or Last-Modified of the response the partial came from, so the server
+    sends the whole file instead of appending new bytes to stale ones when the report changed upstream.
+    """
+    if not os.path.exists(part_path):
+        return {}
+    etag = validators.get('etag')
+    validator = etag if etag and not etag.startswith('W/') else validators.get('last_modified')
+    offset = os.path.getsize(part_path)
+    if not offset or not validator:
+        os.remove(part_path)
+        return {}
+    return {'Range': f"bytes={offset}-", 'If-Range': validator}
+
+
+def parse_articles(html, base_url):
+    """Return (article link, date) pairs from the newsroom search results."""
+    soup = BeautifulSoup(html, 'html.parser')
+    articles = []
+    for article in soup.find_all('div', {'data-testid': 'Article'}):
+        link = article.find('a', href=True)
+        if link is None:
+            continue
+        date_tag = article.find('time') or article.find('span')
+        articles.append((urljoin(base_url, link['href']), date_tag.get_text(strip=True) if date_tag else None))
+    return articles
+
+
+def find_excel_link(html, article_link):
+    """Return the Excel download link from an article page, if it has one."""
+    article_soup = BeautifulSoup(html, 'html.parser')
+    for link in article_soup.find_all('a'):
+        if link.get('href') and '.xlsx' in link['href'] and link.string == "here":
+            return urljoin(article_link, link['href'])
     return None
 
 
-def download_excel_file(download_url, date_tag, article_link, exports_folder):
-    """Download the Excel file and return the data."""
-    filename = os.path.basename(download_url)
+# CRAWL FUNCTIONS
+async def fetch_text(session, url):
+    """GET a page through the pooled session and return its text, or None on a non-200 response."""
+    async with session.get(url) as response:
+        if response.status != 200:
+            return None
+        return await response.text()
+
+
+async def download_excel_file(session, download_url, date_tag, article_link, exports_folder, state, retry=True):
+    """Stream the Excel file to disk, skipping unchanged files and resuming partial downloads."""
+    filename = os.path.basename(download_url.split('?')[0])
     file_path = os.path.join(exports_folder, filename)
+    part_path = f"{file_path}.part"
+    validators = state.get(download_url, {})
 
-    # Download the file if it does not exist
-    if not os.path.exists(file_path):
-        file_response = requests.get(download_url)
-        if file_response.status_code == 200:
-            with open(file_path, 'wb') as f:
-                f.write(file_response.content)
+    request_headers = conditional_headers(file_path, validators)
+    request_headers.update(resume_headers(part_path, validators.get('partial', {})))
+
+    async with session.get(download_url, headers=request_headers) as response:
+        if response.status == 304:
+            status = 'Unchanged'
+        elif response.status == 416 and retry:
+            # The partial is already complete or longer than the file; discard it and download again
+            status = None
+        elif response.status in (200, 206):
+            response_validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            }
+            # Record which version the partial belongs to before writing it, so a resume never mixes versions
+            state[download_url] = {**validators, 'partial': response_validators}
+            save_download_state(exports_folder, state)
+
+            # A 200 means the server ignored the Range header or the file changed, so start the file over
+            mode = 'ab' if response.status == 206 else 'wb'
+            with open(part_path, mode) as f:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    f.write(chunk)
+            os.replace(part_path, file_path)
+            state[download_url] = response_validators
+            status = 'Downloaded'
+        else:
+            status = f"HTTP {response.status}"
+
+    if status is None:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        state.get(download_url, {}).pop('partial', None)
+        return await download_excel_file(session, download_url, date_tag, article_link, exports_folder, state,
+                                         retry=False)
 
     return {
         'File Name': filename,
         'Date Published': date_tag,
         'Article Link': article_link,
-        'Excel Link': download_url
+        'Excel Link': download_url,
+        'Status': status
     }
 
 
+async def fetch_article_data(session, article_link, date_tag, exports_folder, state):
+    """Fetch data from the individual article link and download its Excel file."""
+    html = await fetch_text(session, article_link)
+    download_url = find_excel_link(html, article_link) if html else None
+    if download_url is None:
+        return None
+    return await download_excel_file(session, download_url, date_tag, article_link, exports_folder, state)
+
+
+async def crawl_netflix_articles(url=newsroom_url, exports_folder='exports', max_connections=8):
+    """Fetch every report article concurrently over one pooled session and download new or changed files."""
+    # Create the exports directory if it doesn't exist
+    os.makedirs(exports_folder, exist_ok=True)
+    state = load_download_state(exports_folder)
+
+    connector = aiohttp.TCPConnector(limit=max_connections)
+    async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+        html = await fetch_text(session, url)
+        if html is None:
+            return []
+
+        results = await asyncio.gather(*[
+            fetch_article_data(session, article_link, date_tag, exports_folder, state)
+            for article_link, date_tag in parse_articles(html, url)
+        ], return_exceptions=True)
+
+    save_download_state(exports_folder, state)
+
+    articles_data = []
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error fetching article: {result}")
+        elif result is not None:
+            articles_data.append(result)
+    return articles_data
+
+
+def scrape_netflix_articles(url=newsroom_url, exports_folder='exports', max_connections=8):
+    """Crawl the newsroom, download the reports into exports_folder and return the articles DataFrame."""
+    articles_data = asyncio.run(crawl_netflix_articles(url, exports_folder, max_connections))
+    return create_articles_dataframe(articles_data)
+
+
 def create_articles_dataframe(articles_data):
     """Create a DataFrame from the collected data and format the date."""
-    articles_df = pd.DataFrame(articles_data)
-    articles_df['Date Published'] = pd.to_datetime(articles_df['Date Published'], errors='coerce').dt.strftime('%b %d, %Y')
-    return articles_df.sort_values(by='Date Published', ascending=False)[['Date Published', 'Article Link', 'Excel Link']]
+    articles_df = pd.DataFrame(articles_data, columns=['File Name', 'Date Published', 'Article Link', 'Excel Link',
+                                                       'Status'])
+    published = pd.to_datetime(articles_df['Date Published'], errors='coerce')
+    articles_df['Date Published'] = published.dt.strftime('%b %d, %Y')
+    return articles_df.loc[published.sort_values(ascending=False).index,
+                           ['Date Published', 'Article Link', 'Excel Link']]
+
+
+if __name__ == '__main__':
+    print(scrape_netflix_articles().to_string(index=False))
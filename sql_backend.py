@@ -0,0 +1,137 @@
+import os
+from contextlib import contextmanager
+
+
+# HELPER VARIABLES
+leaderboard_keys = ['Group Title', 'Title', 'Release Date', 'Runtime in Minutes']
+
+# The per-title leaderboards of both media, built once per snapshot. pandas rounds half to even and sums of no
+# values are 0, so the SQL mirrors both
+leaderboard_sql = '''
+    CREATE TABLE leaderboard AS
+    WITH windows AS (
+        SELECT "Media", "Group Title", "Title", "Release Date", "Runtime in Minutes",
+               sum("Hours Viewed") AS "Hours Viewed"
+        FROM rollup
+        WHERE "Media" IS NOT NULL AND {keys_not_null}
+        GROUP BY ALL
+    )
+    SELECT
+        "Media",
+        "Group Title",
+        coalesce(sum(round_even("Hours Viewed" / ("Runtime in Minutes" / 60), 0)), 0) AS "Views",
+        coalesce(sum("Hours Viewed"), 0) AS "Hours Viewed",
+        count(DISTINCT "Title") AS "Title",
+        avg("Runtime in Minutes") AS "Runtime in Minutes"
+    FROM windows
+    GROUP BY "Media", "Group Title"
+'''
+
+
+# HELPER FUNCTIONS
+def quote(column):
+    """Quote a column name as a SQL identifier."""
+    return '"' + column.replace('"', '""') + '"'
+
+
+def not_null(columns):
+    """SQL condition that every column is not null."""
+    return ' AND '.join(f"{quote(column)} IS NOT NULL" for column in columns)
+
+
+def open_connection(dataset):
+    """Open an in-memory DuckDB database over a snapshot's rollup cube, with its leaderboards materialized.
+
+    The persisted Parquet cube is scanned in place as the 'rollup' view, so filters and projections are
+    pushed down into the file scan; without a persisted cube the in-memory frame is registered instead.
+    """
+    # Imported on first use so the pandas backend and the CLI never pay for it
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("The duckdb query backend requires the duckdb package (pip install duckdb)") from None
+
+    con = duckdb.connect()
+    if dataset.rollup_path and os.path.exists(dataset.rollup_path):
+        escaped_path = dataset.rollup_path.replace("'", "''")
+        con.execute(f"CREATE VIEW rollup AS SELECT * FROM read_parquet('{escaped_path}')")
+    else:
+        con.register('rollup', dataset.rollup)
+    con.execute(leaderboard_sql.format(keys_not_null=not_null(leaderboard_keys)))
+    return con
+
+
+@contextmanager
+def connect(dataset):
+    """Yield a cursor on the snapshot's DuckDB database, which is opened once and shared by all its queries.
+
+    Each query gets its own cursor because a DuckDB connection must not be used from several threads at once.
+    """
+    with dataset.derived(('duckdb',), open_connection).cursor() as cursor:
+        yield cursor
+
+
+def count_filter(count_range):
+    """Bounds of '# of Films'/'# of Seasons' for a count range, or every count when None."""
+    return (int(count) for count in count_range) if count_range is not None else (0, 2 ** 31 - 1)
+
+
+# QUERIES
+def grouped_data(dataset, media_type):
+    """combine_windows followed by group_and_aggregate, pushed down to DuckDB."""
+    with connect(dataset) as con:
+        return con.execute('SELECT * EXCLUDE ("Media") FROM leaderboard WHERE "Media" = $media ORDER BY "Group Title"',
+                           {'media': media_type}).df()
+
+
+def top_n_titles(dataset, media_type, metric, count_range=None, n=10, offset=0):
+    """Rows [offset, offset + n) of the leaderboard by metric, with '# of Films'/'# of Seasons' in count_range."""
+    low, high = count_filter(count_range)
+    sql = f'''
+        SELECT * EXCLUDE ("Media") FROM leaderboard
+        WHERE "Media" = $media AND "Title" BETWEEN $low AND $high AND {quote(metric)} IS NOT NULL
+        ORDER BY {quote(metric)} DESC, "Group Title"
+        LIMIT $n OFFSET $offset
+    '''
+    with connect(dataset) as con:
+        return con.execute(sql, {'media': media_type, 'low': low, 'high': high, 'n': int(n),
+                                 'offset': int(offset)}).df()
+
+
+def count_titles(dataset, media_type, metric, count_range=None):
+    """Number of ranked leaderboard rows with '# of Films'/'# of Seasons' in count_range."""
+    low, high = count_filter(count_range)
+    sql = f'''
+        SELECT count(*) FROM leaderboard
+        WHERE "Media" = $media AND "Title" BETWEEN $low AND $high AND {quote(metric)} IS NOT NULL
+    '''
+    with connect(dataset) as con:
+        return con.execute(sql, {'media': media_type, 'low': low, 'high': high}).fetchone()[0]
+
+
+def fiscal_half_summary(dataset, column_choice):
+    """Views summed per grouping column, fiscal half and start date, pushed down to DuckDB."""
+    keys = [column_choice, 'Fiscal Half', 'Start Date']
+    sql = f'''
+        SELECT {', '.join(map(quote, keys))}, coalesce(sum("Views"), 0) AS "Views"
+        FROM rollup
+        WHERE {not_null(keys)}
+        GROUP BY ALL
+        ORDER BY {', '.join(map(quote, keys))}
+    '''
+    with connect(dataset) as con:
+        return con.execute(sql).df()
+
+
+def trend_cells(dataset, level, metric):
+    """The metric per Media, title level, Start Date and Fiscal Half, as TrendMatrix aggregates the rollup cube."""
+    keys = ['Media', level, 'Start Date', 'Fiscal Half']
+    sql = f'''
+        SELECT {', '.join(map(quote, keys))}, coalesce(sum({quote(metric)}), 0) AS {quote(metric)}
+        FROM rollup
+        WHERE {not_null(keys)}
+        GROUP BY ALL
+        ORDER BY {', '.join(map(quote, keys))}
+    '''
+    with connect(dataset) as con:
+        return con.execute(sql).df().set_index(keys)[metric]
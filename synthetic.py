@@ -0,0 +1,101 @@
+import os
+import numpy as np
+import openpyxl
+
+
+# HELPER VARIABLES
+report_prefix = 'Synthetic_Netflix_Engagement_Report'
+header_rows = 5
+
+report_columns = ['Title', 'Available Globally?', 'Release Date', 'Hours Viewed', 'Runtime', 'Views']
+engagement_columns = ['Title', 'Available Globally?', 'Release Date', 'Hours Viewed']
+
+
+# HELPER FUNCTIONS
+def report_periods(n_reports, first_year=2023):
+    """Return (year, 'Jan-Jun' | 'Jul-Dec') for n consecutive half-year reports, starting with H1 first_year."""
+    return [(first_year + i // 2, 'Jan-Jun' if i % 2 == 0 else 'Jul-Dec') for i in range(n_reports)]
+
+
+def make_titles(n_titles, media_type, rng):
+    """Make unique titles shaped like the real exports: seasons, sequels and plain names."""
+    ids = np.arange(n_titles)
+    if media_type == 'TV':
+        seasons = rng.integers(1, 6, n_titles)
+        return [f"Synthetic Series {i}: Season {season}" for i, season in zip(ids, seasons)]
+    sequels = rng.integers(1, 4, n_titles)
+    return [f"Synthetic Film {i}" if sequel == 1 else f"Synthetic Film {i} {sequel}"
+            for i, sequel in zip(ids, sequels)]
+
+
+def make_rows(titles, media_type, year, rng, with_runtime=True):
+    """Make sheet rows for titles with plausible hours, runtimes, views and release dates."""
+    n_titles = len(titles)
+    minutes = rng.integers(80, 140, n_titles) if media_type == 'Film' else rng.integers(200, 600, n_titles)
+    hours_viewed = rng.integers(1, 1_000, n_titles) * 100_000
+    views = np.maximum(np.round(hours_viewed / (minutes / 60), -2), 100).astype(int)
+    licensed = rng.random(n_titles) < 0.4
+    hidden_runtime = rng.random(n_titles) < 0.05
+    globally = np.where(rng.random(n_titles) < 0.5, 'Yes', 'No')
+    release_days = rng.integers(0, 365, n_titles)
+
+    rows = []
+    for i, title in enumerate(titles):
+        release_date = None if licensed[i] else str(np.datetime64(f"{year - 1}-01-01") + release_days[i])
+        row = [title, globally[i], release_date, int(hours_viewed[i])]
+        if with_runtime:
+            runtime = "*" if hidden_runtime[i] else f"{minutes[i] // 60}:{minutes[i] % 60:02d}"
+            row += [runtime, int(views[i])]
+        rows.append(row)
+    return rows
+
+
+def write_sheet(workbook, sheet_name, columns, rows, title):
+    """Write a sheet in the export layout: 5 header rows and a leading blank column."""
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append([None, title])
+    for _ in range(header_rows - 1):
+        sheet.append([])
+    sheet.append([None] + columns)
+    for row in rows:
+        sheet.append([None] + row)
+
+
+# GENERATOR
+def generate_reports(folder, n_reports=10, n_titles=20_000, seed=0):
+    """Write n_reports synthetic half-year workbooks into folder and return their paths.
+
+    The first report is H1 2023 with a single Engagement sheet, like the real exports; later
+    reports have Film and TV sheets. Titles are drawn from a shared pool so they repeat across
+    reports, and n_titles is split between films and TV seasons. Synthetic workbooks left in folder by an
+    earlier run are removed first, so the folder only holds the reports asked for.
+    """
+    os.makedirs(folder, exist_ok=True)
+    for filename in os.listdir(folder):
+        if filename.startswith(report_prefix) and filename.endswith('.xlsx'):
+            os.remove(os.path.join(folder, filename))
+
+    rng = np.random.default_rng(seed)
+    pools = {'Film': make_titles(n_titles, 'Film', rng), 'TV': make_titles(n_titles, 'TV', rng)}
+
+    paths = []
+    for year, period in report_periods(n_reports):
+        workbook = openpyxl.Workbook(write_only=True)
+        title = f"What We Watched: A Netflix Engagement Report ({period} {year})"
+        sizes = {'Film': n_titles // 2, 'TV': n_titles - n_titles // 2}
+        picks = {media_type: sorted(rng.choice(len(pools[media_type]), size, replace=False))
+                 for media_type, size in sizes.items()}
+
+        if (year, period) == (2023, 'Jan-Jun'):
+            rows = [row for media_type in ['Film', 'TV'] for row in make_rows(
+                [pools[media_type][i] for i in picks[media_type]], media_type, year, rng, with_runtime=False)]
+            write_sheet(workbook, 'Engagement', engagement_columns, rows, title)
+        else:
+            for media_type in ['Film', 'TV']:
+                rows = make_rows([pools[media_type][i] for i in picks[media_type]], media_type, year, rng)
+                write_sheet(workbook, media_type, report_columns, rows, title)
+
+        path = os.path.join(folder, f"{report_prefix}_{year}{period}.xlsx")
+        workbook.save(path)
+        paths.append(path)
+    return paths
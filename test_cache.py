@@ -0,0 +1,24 @@
+import os
+import pandas as pd
+import cache
+
+
+# TESTS
+def test_rollup_pruning_is_scoped_to_folder_and_variant(tmp_path):
+    folder = str(tmp_path / 'cache')
+    cube = pd.DataFrame({'Views': [1.0]})
+
+    def write(folder_path, fingerprint, variant):
+        cache.get_cached_rollup(folder_path, fingerprint, lambda: cube, variant, folder)
+        return cache.rollup_path(folder_path, fingerprint, variant, folder)
+
+    other_folder = write('other_exports', (('a.xlsx', 1, 1),), 'compact')
+    other_variant = write('exports', (('a.xlsx', 1, 1),), 'full')
+    first = write('exports', (('a.xlsx', 1, 1),), 'compact')
+    os.utime(first, (1, 1))
+    second = write('exports', (('a.xlsx', 1, 1), ('b.xlsx', 1, 1)), 'compact')
+    third = write('exports', (('a.xlsx', 1, 1), ('b.xlsx', 1, 1), ('c.xlsx', 1, 1)), 'compact')
+
+    assert not os.path.exists(first)
+    for path in [other_folder, other_variant, second, third]:
+        assert os.path.exists(path)
@@ -0,0 +1,213 @@
+import os
+import re
+import shutil
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytest
+import data
+import synthetic
+import titles
+
+
+# HELPER FUNCTIONS
+def legacy_get_group_title(title, group_title_exceptions):
+    """get_group_title as it was before vectorization."""
+    group_title = group_title_exceptions.get(title)
+    if group_title:
+        return group_title
+
+    title = re.sub(r'\s\d$', '', title)
+
+    return re.split(':|//', title)[0]
+
+
+def legacy_clean_initial_publish(initial_publish, helper_data):
+    """clean_initial_publish as it was before vectorization: a merge followed by row-wise applies."""
+    helper_data = helper_data.drop_duplicates(['Title'])
+    initial_publish = initial_publish.merge(helper_data[['Title', 'Media', 'Runtime in Minutes']], on='Title',
+                                            how='left')
+
+    initial_publish['Media'] = initial_publish.apply(
+        lambda row: 'TV' if pd.isnull(row['Media']) and 'Season' in row['Title'] else
+        'Film' if pd.isnull(row['Media']) else row['Media'],
+        axis=1
+    )
+
+    avg_runtimes = helper_data.groupby('Media')['Runtime in Minutes'].mean()
+    initial_publish['Runtime in Minutes'] = initial_publish.apply(
+        lambda row: avg_runtimes.get(row['Media'], np.nan) if pd.isnull(row['Runtime in Minutes']) else row[
+            'Runtime in Minutes'],
+        axis=1
+    )
+
+    return initial_publish
+
+
+@pytest.fixture(autouse=True)
+def normalizer(tmp_path, monkeypatch):
+    """Use a TitleNormalizer whose group title cache lives in a temporary folder."""
+    normalizer = titles.TitleNormalizer(folder=str(tmp_path))
+    monkeypatch.setattr(titles, '_normalizer', normalizer)
+    return normalizer
+
+
+# TESTS
+def test_convert_runtimes_to_minutes_matches_scalar():
+    runtimes = pd.Series(['1:30', '0:45', ' 2 : 05', '+1:10', '1:30:00', '1h30', 'abc', ':30', '2:', '', np.nan],
+                         dtype=object)
+    expected = runtimes.map(data.convert_runtime_to_minutes).astype(float)
+    pd.testing.assert_series_equal(data.convert_runtimes_to_minutes(runtimes), expected, check_names=False)
+
+
+def test_calculate_runtimes_matches_scalar():
+    sheet = pd.DataFrame({
+        'Runtime': ['*', '*', '*', '*', '*', '1:45', 'bad', np.nan, '0:59'],
+        'Hours Viewed': [1_500_000, 1_000_000, np.nan, 100, 250, 2_000_000, 5, 6, 7],
+        'Views': [1_000_000, 0, 400_000, np.nan, 100, 900_000, 1, 1, 1]
+    })
+    expected = sheet.apply(data.calculate_runtime, axis=1).astype(float)
+    pd.testing.assert_series_equal(data.calculate_runtimes(sheet), expected, check_names=False)
+
+
+def test_get_group_titles_matches_scalar(normalizer):
+    title_series = pd.Series([
+        'Bridgerton: Season 3', 'The Seven Deadly Sins // 七つの大罪', 'Despicable Me 2', 'Despicable Me 12',
+        'Rocky 4 2', 'Plain Title', 'A: B // C', 'Title 2: Part 1', 'Rebel Moon',
+        'Pokémon the Movie: Secrets of the Jungle', 'Bright: Samurai Soul // ブライト: サムライソウル', ' 3'
+    ])
+    expected = title_series.map(lambda title: legacy_get_group_title(title, normalizer.group_title_exceptions))
+    pd.testing.assert_series_equal(data.get_group_titles(title_series), expected)
+
+    # A second pass is served from the memoized group titles
+    pd.testing.assert_series_equal(data.get_group_titles(title_series), expected)
+
+
+def test_determine_ownerships_matches_scalar():
+    title_series = pd.Series(['Arrested Development', 'Arrested Development', 'Stranger Things', 'Friends'])
+    release_dates = pd.Series([np.nan, '2013-05-26', '2016-07-15', np.nan], dtype=object)
+    expected = pd.Series([data.determine_ownership(title, release_date)
+                          for title, release_date in zip(title_series, release_dates)])
+    pd.testing.assert_series_equal(data.determine_ownerships(title_series, release_dates), expected)
+
+
+def test_clean_initial_publish_matches_merge_and_apply():
+    helper_data = pd.DataFrame({
+        'Title': ['Extraction', 'The Mother', 'Wednesday: Season 1', 'Unknown Runtime', 'Ozark: Season 4'],
+        'Media': ['Film', 'Film', 'TV', 'Film', 'TV'],
+        'Runtime in Minutes': [117.0, 115.0, 485.0, np.nan, 600.0],
+        'Start Date': ['2023-07-01'] * 5
+    })
+    initial_publish = pd.DataFrame({
+        'Title': ['Extraction', 'Wednesday: Season 1', 'Unknown Runtime', 'New Show: Season 2', 'New Film',
+                  'Ozark: Season 4'],
+        'Hours Viewed': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    })
+
+    expected = legacy_clean_initial_publish(initial_publish, helper_data)
+    pd.testing.assert_frame_equal(data.clean_initial_publish(initial_publish, helper_data), expected)
+
+
+def test_get_group_titles_beyond_lru_bound(tmp_path):
+    normalizer = titles.TitleNormalizer(folder=str(tmp_path), max_size=3)
+    title_series = pd.Series([f'Show {i}: Season 1' for i in range(10)])
+    pd.testing.assert_series_equal(normalizer.get_group_titles(title_series),
+                                   pd.Series([f'Show {i}' for i in range(10)]))
+    assert len(normalizer.group_titles) == 3
+
+
+def test_lookup_titles_keeps_alternate_language_titles_apart():
+    title_lookup = data.build_title_lookup(pd.DataFrame({
+        'Title': ['Shadow: Season 1', 'Once Upon A Time: Season 1 // Pada Zaman Dahulu: Musim 1', 'Poison',
+                  'Love Is Blind: Japan: Season 1 // ラブ・イズ・ブラインド JAPAN: シーズン1'],
+        'Media': 'TV',
+        'Runtime in Minutes': [344.0, 77.0, 90.0, 400.0],
+        'Start Date': '2023-07-01'
+    }))
+    engagement_titles = pd.Series([
+        'Shadow: Season 1', 'Shadow: Season 1 // ظل: موسم 1',
+        'Once Upon a Time: Season 1 // أهو ده اللي صار: موسم 1', 'Poison // Veleno',
+        'Love is Blind: Japan: Season 1 // ラブ・イズ・ブラインド JAPAN: シーズン1'
+    ])
+    assert data.lookup_titles(title_lookup, engagement_titles).tolist() == [0, -1, -1, 2, 3]
+
+
+def report_rows(media_type, rows, start_date, end_date):
+    """Processed Film or TV sheet rows from (title, runtime in minutes) pairs."""
+    df = pd.DataFrame(rows, columns=['Title', 'Runtime in Minutes'])
+    df['Hours Viewed'] = 1_000_000.0
+    df['Release Date'] = np.nan
+    df['Start Date'], df['End Date'] = start_date, end_date
+    df['Group Title'] = data.get_group_titles(df['Title'])
+    df['Ownership'] = data.determine_ownerships(df['Title'], df['Release Date'])
+    df['Media'] = media_type
+    return df
+
+
+def assert_frames_equal(left, right):
+    pd.testing.assert_frame_equal(left.reset_index(drop=True), right.reset_index(drop=True), check_categorical=False)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_add_reports_matches_full_rebuild(compact):
+    film_first = report_rows('Film', [('Known', 100.0), ('No Runtime', np.nan), ('Solo', 95.0)],
+                             '2023-07-01', '2023-12-31')
+    tv_first = report_rows('TV', [('Show: Season 1', 300.0)], '2023-07-01', '2023-12-31')
+    film_second = report_rows('Film', [('Other', 200.0), ('Known', 110.0), ('Solo', 105.0)],
+                              '2024-01-01', '2024-06-30')
+    tv_second = report_rows('TV', [('Another Show: Season 1', 500.0)], '2024-01-01', '2024-06-30')
+
+    engagement_raw = pd.DataFrame({
+        'Title': ['Known', 'No Runtime', 'Show: Season 1', 'Missing Film', 'Missing: Season 1', 'OTHER',
+                  'Another Show: Season 1 // Otro Show: Temporada 1', 'Solo // Solitario'],
+        'Hours Viewed': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0],
+        'Release Date': np.nan
+    })
+    engagement_raw['Start Date'], engagement_raw['End Date'] = '2023-01-01', '2023-06-30'
+    engagement_raw['Group Title'] = data.get_group_titles(engagement_raw['Title'])
+    engagement_raw['Ownership'] = data.determine_ownerships(engagement_raw['Title'], engagement_raw['Release Date'])
+
+    incremental = data.ViewershipState(film_first.copy(), tv_first.copy(), engagement_raw.copy(), compact)
+    incremental.add_reports(film_second.copy(), tv_second.copy())
+    full = data.ViewershipState(pd.concat([film_first, film_second], ignore_index=True),
+                                pd.concat([tv_first, tv_second], ignore_index=True), engagement_raw.copy(), compact)
+
+    for incremental_frame, full_frame in zip(incremental.frames, full.frames):
+        assert_frames_equal(incremental_frame, full_frame)
+
+
+def test_incremental_ingestion_matches_full_ingestion(tmp_path):
+    paths = synthetic.generate_reports(str(tmp_path / 'all'), n_reports=4, n_titles=200)
+    os.makedirs(tmp_path / 'incremental')
+    for path in paths[:3]:
+        shutil.copy(path, tmp_path / 'incremental')
+
+    incremental = data.ViewershipDataset(str(tmp_path / 'incremental'), use_cache=False, max_workers=1)
+    incremental.snapshot()
+    shutil.copy(paths[3], tmp_path / 'incremental')
+    assert incremental.reload()
+    full = data.ViewershipDataset(str(tmp_path / 'all'), use_cache=False, max_workers=1)
+
+    for name in ['film_data', 'tv_data', 'engagement_data']:
+        assert_frames_equal(getattr(incremental, name), getattr(full, name))
+    rollups = [dataset.rollup.astype({col: str for col in data.rollup_categories})
+               .sort_values(data.rollup_dimensions).reset_index(drop=True) for dataset in [incremental, full]]
+    pd.testing.assert_frame_equal(*rollups)
+
+
+@pytest.mark.parametrize('chunk_size', [3, 10_000])
+def test_read_sheet_matches_read_excel(tmp_path, chunk_size):
+    rng = np.random.default_rng(0)
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    synthetic.write_sheet(workbook, 'Film', synthetic.report_columns,
+                          synthetic.make_rows(synthetic.make_titles(8, 'Film', rng), 'Film', 2024, rng), 'Film')
+    sheet = workbook['Film']
+    # Formatted but empty cells past the last column and row widen the sheet's declared dimensions
+    sheet.cell(row=8, column=len(synthetic.report_columns) + 2).font = openpyxl.styles.Font(bold=True)
+    sheet.cell(row=sheet.max_row + 3, column=2).font = openpyxl.styles.Font(bold=True)
+    path = str(tmp_path / 'report.xlsx')
+    workbook.save(path)
+
+    expected = pd.read_excel(path, sheet_name='Film', skiprows=5).iloc[:, 1:]
+    pd.testing.assert_frame_equal(data.read_sheet(path, 'Film', chunk_size=chunk_size), expected)
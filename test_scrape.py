@@ -0,0 +1,115 @@
+import os
+import asyncio
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import scrape
+
+
+# HELPER VARIABLES
+report_name = 'What_We_Watched_A_Netflix_Engagement_Report_2024Jan-Jun.xlsx'
+report_bytes = bytes(range(256)) * 40
+
+
+# STUB SERVER
+class StubNewsroom:
+    """A newsroom with one article linking to one report, honouring conditional and range requests."""
+
+    def __init__(self, body=report_bytes, etag='"v1"'):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+
+    async def newsroom(self, request):
+        return web.Response(content_type='text/html', text=(
+            '<div data-testid="Article"><a href="/article">What We Watched</a><time>Sep 19, 2024</time></div>'))
+
+    async def article(self, request):
+        return web.Response(content_type='text/html', text=f'<p>Download <a href="/files/{report_name}">here</a></p>')
+
+    async def report(self, request):
+        self.requests.append(dict(request.headers))
+        if request.headers.get('If-None-Match') == self.etag:
+            return web.Response(status=304, headers={'ETag': self.etag})
+
+        range_header = request.headers.get('Range')
+        if range_header and request.headers.get('If-Range') == self.etag:
+            offset = int(range_header.split('=')[1].rstrip('-'))
+            if offset >= len(self.body):
+                return web.Response(status=416, headers={'Content-Range': f"bytes */{len(self.body)}"})
+            return web.Response(status=206, body=self.body[offset:], headers={
+                'ETag': self.etag, 'Content-Range': f"bytes {offset}-{len(self.body) - 1}/{len(self.body)}"})
+        return web.Response(body=self.body, headers={'ETag': self.etag})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/newsroom', self.newsroom)
+        app.router.add_get('/article', self.article)
+        app.router.add_get(f'/files/{report_name}', self.report)
+        return app
+
+
+def crawl(stub, exports_folder, runs=1, partial=None, partial_validators=None):
+    """Crawl the stub newsroom runs times and return the statuses of each run.
+
+    partial leaves the bytes of an interrupted download behind first, saved with partial_validators as the
+    validators of the response it came from.
+    """
+    async def run():
+        async with TestServer(stub.app()) as server:
+            if partial is not None:
+                with open(os.path.join(exports_folder, f"{report_name}.part"), 'wb') as f:
+                    f.write(partial)
+            if partial_validators is not None:
+                url = str(server.make_url(f'/files/{report_name}'))
+                scrape.save_download_state(exports_folder, {url: {'partial': partial_validators}})
+
+            statuses = []
+            for _ in range(runs):
+                articles = await scrape.crawl_netflix_articles(str(server.make_url('/newsroom')), exports_folder)
+                statuses.append([article['Status'] for article in articles])
+            return statuses
+    return asyncio.run(run())
+
+
+def read_report(exports_folder):
+    with open(os.path.join(exports_folder, report_name), 'rb') as f:
+        return f.read()
+
+
+# TESTS
+def test_download_then_unchanged(tmp_path):
+    stub = StubNewsroom()
+    assert crawl(stub, str(tmp_path), runs=2) == [['Downloaded'], ['Unchanged']]
+    assert stub.requests[-1]['If-None-Match'] == '"v1"'
+    assert read_report(str(tmp_path)) == report_bytes
+    assert not os.path.exists(os.path.join(tmp_path, f"{report_name}.part"))
+
+
+def test_resume_partial_download(tmp_path):
+    stub = StubNewsroom()
+    assert crawl(stub, str(tmp_path), partial=report_bytes[:1000], partial_validators={'etag': '"v1"'}) == [
+        ['Downloaded']]
+    assert stub.requests[-1]['Range'] == 'bytes=1000-'
+    assert read_report(str(tmp_path)) == report_bytes
+
+
+def test_changed_report_restarts_partial(tmp_path):
+    stub = StubNewsroom(body=b'new report' * 500, etag='"v2"')
+    crawl(stub, str(tmp_path), partial=report_bytes[:1000], partial_validators={'etag': '"v1"'})
+    assert stub.requests[-1]['If-Range'] == '"v1"'
+    assert read_report(str(tmp_path)) == b'new report' * 500
+
+
+def test_complete_partial_is_downloaded_again(tmp_path):
+    stub = StubNewsroom()
+    assert crawl(stub, str(tmp_path), partial=report_bytes, partial_validators={'etag': '"v1"'}) == [['Downloaded']]
+    assert [request.get('Range') for request in stub.requests] == [f'bytes={len(report_bytes)}-', None]
+    assert read_report(str(tmp_path)) == report_bytes
+
+
+def test_partial_without_validators_is_discarded(tmp_path):
+    stub = StubNewsroom()
+    crawl(stub, str(tmp_path), partial=b'stale bytes')
+    assert 'Range' not in stub.requests[-1]
+    assert read_report(str(tmp_path)) == report_bytes
+    assert [validators['etag'] for validators in scrape.load_download_state(str(tmp_path)).values()] == ['"v1"']
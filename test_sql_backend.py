@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+import data
+import queries
+import synthetic
+import titles
+
+pytest.importorskip('duckdb')
+
+
+# HELPER FUNCTIONS
+@pytest.fixture
+def datasets(tmp_path, monkeypatch):
+    """A pandas and an out-of-core dataset over the same synthetic reports, with the caches in tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(titles, '_normalizer', titles.TitleNormalizer(folder=str(tmp_path)))
+    synthetic.generate_reports('exports', n_reports=4, n_titles=300)
+    return (data.ViewershipDataset('exports', max_workers=1, out_of_core=False).snapshot(),
+            data.ViewershipDataset('exports', max_workers=1, out_of_core=True).snapshot())
+
+
+def query(monkeypatch, backend, func, *args):
+    monkeypatch.setattr(queries, 'query_backend', backend)
+    return func(*args)
+
+
+def assert_same(monkeypatch, datasets, func, *args, check_dtype=True):
+    """Assert that a query gives the same result from the pandas path and the DuckDB backend."""
+    expected = query(monkeypatch, 'pandas', func, datasets[0], *args)
+    result = query(monkeypatch, 'duckdb', func, datasets[1], *args)
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True),
+                                      check_dtype=check_dtype, check_categorical=False)
+    else:
+        assert result == expected
+
+
+# TESTS
+def test_out_of_core_snapshot_keeps_frames_on_disk(datasets):
+    snapshot = datasets[1]
+    assert callable(snapshot._frames) and snapshot._rollup is None
+    assert len(snapshot.rollup) == len(datasets[0].rollup)
+
+
+@pytest.mark.parametrize('media_type', ['Film', 'TV'])
+@pytest.mark.parametrize('metric', ['Views', 'Hours Viewed'])
+def test_leaderboards_match_pandas(monkeypatch, datasets, media_type, metric):
+    assert_same(monkeypatch, datasets, queries.get_grouped_data, media_type, check_dtype=False)
+    for count_range in [None, (1, 1), (2, 5)]:
+        assert_same(monkeypatch, datasets, queries.count_top_n_titles, media_type, metric, count_range)
+        for offset in [0, 10, 250]:
+            assert_same(monkeypatch, datasets, queries.get_top_n_page, media_type, metric, count_range, 10, offset,
+                        check_dtype=False)
+
+
+@pytest.mark.parametrize('column_choice', ['Media', 'Ownership'])
+def test_fiscal_half_summary_matches_pandas(monkeypatch, datasets, column_choice):
+    assert_same(monkeypatch, datasets, queries.build_fiscal_half_summary, column_choice, check_dtype=False)
+
+
+@pytest.mark.parametrize('level', ['Group Title', 'Title'])
+def test_trend_matrix_matches_pandas(monkeypatch, datasets, level):
+    expected = query(monkeypatch, 'pandas', queries.get_trend_matrix, datasets[0], level, 'Views')
+    result = query(monkeypatch, 'duckdb', queries.get_trend_matrix, datasets[1], level, 'Views')
+    np.testing.assert_array_equal(result.names, expected.names)
+    np.testing.assert_array_equal(result.windows, expected.windows)
+    np.testing.assert_array_equal(result.values, expected.values)
+    np.testing.assert_array_equal(result.reported, expected.reported)
@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import hashlib
+from collections import OrderedDict
+import pandas as pd
+import numpy as np
+import cache
+
+
+# HELPER VARIABLES
+config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'title_exceptions.json')
+cache_filename = 'titles.json'
+max_cached_titles = 100_000
+
+trailing_number_pattern = re.compile(r'\s\d$')
+group_title_delimiter_pattern = re.compile(':|//')
+
+
+# HELPER FUNCTIONS
+def load_exceptions(path=config_path):
+    """Load the group title and licensed exception tables from the JSON config file."""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+    return config.get('group_title_exceptions', {}), config.get('licensed_exceptions', {})
+
+
+def exceptions_hash(group_title_exceptions, licensed_exceptions):
+    """Return a short hash of the exception tables, used to invalidate derived caches."""
+    key = json.dumps([group_title_exceptions, licensed_exceptions], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+def split_group_titles(titles):
+    """Derive group titles from title structure alone: drop a trailing digit, then cut at ':' or '//'."""
+    stripped = titles.str.replace(trailing_number_pattern, '', regex=True)
+    return stripped.str.split(group_title_delimiter_pattern, n=1, regex=True).str[0]
+
+
+def normalize_titles(titles):
+    """Match keys for whole titles: NFKC-normalized, casefolded, '&' as 'and', punctuation (and '//') dropped."""
+    normalized = titles.map(str, na_action='ignore').str.normalize('NFKC').str.casefold()
+    normalized = normalized.str.replace('&', ' and ', regex=False)
+    return normalized.str.replace(r'[\W_]+', ' ', regex=True).str.strip()
+
+
+def primary_match_keys(titles, match_keys=None):
+    """Match keys of the part before '//' (the English name); the match key itself for titles without one."""
+    match_keys = normalize_titles(titles) if match_keys is None else match_keys
+    alternate = titles.str.contains('//', regex=False, na=False)
+    primary = match_keys.copy()
+    primary[alternate] = normalize_titles(titles[alternate].str.split('//', n=1, regex=False).str[0])
+    return primary
+
+
+def fallback_match_keys(titles, match_keys=None):
+    """Primary match keys of titles with an alternate-language part, NaN for other titles.
+
+    A title gets no fallback key when another listed title shares its English name, e.g. 'Shadow: Season 1 //
+    ظل: موسم 1' next to 'Shadow: Season 1', since the two are different shows.
+    """
+    match_keys = normalize_titles(titles) if match_keys is None else match_keys
+    primary = primary_match_keys(titles, match_keys)
+    names = pd.DataFrame({'primary': primary, 'key': match_keys}).drop_duplicates()
+    shared = names.loc[names['primary'].duplicated(keep=False), 'primary']
+    return primary.where(titles.str.contains('//', regex=False, na=False) & ~primary.isin(shared))
+
+
+# NORMALIZER
+class TitleNormalizer:
+    """Map raw titles to group titles and ownership using the configured exception tables.
+
+    Group titles are memoized in a bounded LRU keyed by raw title and persisted in the data cache
+    folder, so only titles never seen before pay the regex cost. The persisted entries are dropped
+    whenever the exception tables change.
+    """
+
+    def __init__(self, config_path=config_path, folder=cache.cache_folder, max_size=max_cached_titles):
+        self.group_title_exceptions, self.licensed_exceptions = load_exceptions(config_path)
+        self.config_hash = exceptions_hash(self.group_title_exceptions, self.licensed_exceptions)
+        self.cache_path = os.path.join(folder, cache_filename)
+        self.max_size = max_size
+        self.group_titles = OrderedDict(self.read_cache())
+        self.dirty = False
+
+    def read_cache(self):
+        """Read persisted group titles, or nothing if missing or built from other exception tables."""
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entry.get('group_titles', {}) if entry.get('config_hash') == self.config_hash else {}
+
+    def remember(self, group_titles):
+        """Add new group titles to the LRU, evicting the least recently used beyond max_size."""
+        self.group_titles.update(group_titles)
+        while len(self.group_titles) > self.max_size:
+            self.group_titles.popitem(last=False)
+        self.dirty = True
+
+    def get_group_title(self, title):
+        """Get group title based on exceptions or title structure."""
+        return self.get_group_titles(pd.Series([title])).iloc[0]
+
+    def get_group_titles(self, titles):
+        """Group titles for a Series of titles, running the regexes only on uncached titles."""
+        unique_titles = titles.dropna().unique()
+        group_titles, missing = {}, []
+        for title in unique_titles:
+            if title in self.group_titles:
+                self.group_titles.move_to_end(title)
+                group_titles[title] = self.group_titles[title]
+            else:
+                missing.append(title)
+
+        if missing:
+            missing = pd.Series(missing, dtype=object)
+            derived = missing.map(self.group_title_exceptions).fillna(split_group_titles(missing))
+            group_titles.update(zip(missing, derived))
+            # The LRU bound only limits what is kept and persisted, never the titles mapped here
+            self.remember(zip(missing, derived))
+
+        return titles.map(group_titles)
+
+    def determine_ownerships(self, titles, release_dates):
+        """Licensed when listed in the exceptions or missing a release date, otherwise Original."""
+        default = pd.Series(np.where(release_dates.isnull(), "Licensed", "Original"), index=titles.index)
+        return titles.map(self.licensed_exceptions).fillna(default)
+
+    def save(self):
+        """Merge new group titles into the persisted cache; entries written by other processes are kept."""
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        group_titles = OrderedDict(self.read_cache())
+        group_titles.update(self.group_titles)
+        while len(group_titles) > self.max_size:
+            group_titles.popitem(last=False)
+
+        def write(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'config_hash': self.config_hash, 'group_titles': group_titles}, f, ensure_ascii=False)
+
+        cache.write_atomic(self.cache_path, write)
+        self.dirty = False
+
+
+_normalizer = None
+
+
+def get_normalizer():
+    """Return the process-wide TitleNormalizer, loading the config and cache on first use."""
+    global _normalizer
+    if _normalizer is None:
+        _normalizer = TitleNormalizer()
+    return _normalizer
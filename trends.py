@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import metrics
+
+
+# HELPER VARIABLES
+trend_levels = ['Group Title', 'Title']
+
+
+# TREND MATRIX
+class TrendMatrix:
+    """A metric per (Media, title) row and reporting window column, as a dense array built from the rollup cube.
+
+    Windows are ordered by Start Date. A title missing from a report counts as 0 in values and is flagged
+    False in reported, so deltas, rolling sums and decay curves are whole-array operations. cells optionally
+    gives the metric already summed per (Media, level, Start Date, Fiscal Half), e.g. by the DuckDB backend,
+    in which case rollup is not read.
+    """
+
+    @metrics.timed('trend_matrix')
+    def __init__(self, rollup, level='Title', metric='Views', cells=None):
+        self.level = level
+        self.metric = metric
+
+        if cells is None:
+            cells = rollup.groupby(['Media', level, 'Start Date', 'Fiscal Half'], observed=True)[metric].sum()
+        windows = cells.index.droplevel(['Media', level]).unique().sort_values()
+        self.window_starts = pd.DatetimeIndex(windows.get_level_values('Start Date'))
+        self.windows = pd.Index(windows.get_level_values('Fiscal Half').astype(str), name='Fiscal Half')
+
+        rows, keys = cells.index.droplevel(['Start Date', 'Fiscal Half']).factorize()
+        self.media = np.asarray(keys.get_level_values(0).astype(str), dtype=object)
+        self.names = np.asarray(keys.get_level_values(1).astype(str), dtype=object)
+        columns = self.window_starts.get_indexer(cells.index.get_level_values('Start Date'))
+        self.values = np.zeros((len(keys), len(self.windows)))
+        self.reported = np.zeros(self.values.shape, dtype=bool)
+        self.values[rows, columns] = cells.to_numpy()
+        self.reported[rows, columns] = True
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def rows(self, media_type=None, names=None):
+        """Return the row positions for a media type and/or a list of titles, or every row."""
+        mask = np.ones(len(self.names), dtype=bool)
+        if media_type is not None:
+            mask &= self.media == media_type
+        if names is not None:
+            mask &= np.isin(self.names, list(names))
+        return np.flatnonzero(mask)
+
+    def deltas(self, periods=1):
+        """Change of the metric over periods windows (half-over-half for periods=1); NaN before the first."""
+        deltas = np.full(self.shape, np.nan)
+        deltas[:, periods:] = self.values[:, periods:] - self.values[:, :-periods]
+        return deltas
+
+    def rolling(self, window=2):
+        """Rolling sum over the last window reporting windows, summing fewer at the start."""
+        cumulative = np.cumsum(self.values, axis=1)
+        rolling = cumulative.copy()
+        rolling[:, window:] -= cumulative[:, :-window]
+        return rolling
+
+    def rising(self, n=10, media_type=None, window=-1):
+        """Return the n titles with the largest gain in a window over the previous one.
+
+        Only titles reported in both windows count, so debuts are not mistaken for risers.
+        """
+        rows = self.rows(media_type)
+        column = window % self.shape[1] if self.shape[1] else 0
+        if column == 0:
+            return self.rising_frame(rows[:0], 1) if self.shape[1] > 1 else pd.DataFrame(
+                columns=['Media', self.level, f'Previous {self.metric}', self.metric, 'Change', 'Change %'])
+
+        current, previous = self.values[rows, column], self.values[rows, column - 1]
+        candidates = self.reported[rows, column] & self.reported[rows, column - 1]
+        gain = np.where(candidates, current - previous, -np.inf)
+        top = np.argsort(-gain, kind='stable')[:n]
+        return self.rising_frame(rows[top[np.isfinite(gain[top])]], column)
+
+    def rising_frame(self, rows, column):
+        """Tabulate the previous and current window values of rows with their change."""
+        previous = self.values[rows, column - 1]
+        current = self.values[rows, column]
+        return pd.DataFrame({
+            'Media': self.media[rows],
+            self.level: self.names[rows],
+            f'Previous {self.metric}': previous,
+            self.metric: current,
+            'Change': current - previous,
+            'Change %': np.divide(current - previous, previous, out=np.full(len(rows), np.nan), where=previous > 0)
+        })
+
+    def decay(self, rows=None):
+        """Return each row's metric in its 1st, 2nd, ... window since its first report, relative to the first.
+
+        Windows past the latest report are NaN rather than 0, so averages only cover titles old enough.
+        """
+        rows = np.arange(len(self.names)) if rows is None else rows
+        values, reported = self.values[rows], self.reported[rows]
+        first = reported.argmax(axis=1)
+        positions = first[:, None] + np.arange(self.shape[1])
+        in_range = positions < self.shape[1]
+        aligned = np.take_along_axis(values, np.minimum(positions, self.shape[1] - 1), axis=1)
+        aligned[~in_range] = np.nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return aligned / aligned[:, :1]
+
+    def decay_curve(self, media_type=None):
+        """Average share of first-window metric retained in later windows, per window since first report."""
+        curves = self.decay(self.rows(media_type))
+        curves[~np.isfinite(curves)] = np.nan
+        counted = np.isfinite(curves).sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            mean = np.nansum(curves, axis=0) / counted
+        return pd.DataFrame({'Windows Since First Report': np.arange(1, self.shape[1] + 1),
+                             'Share of First Window': mean, 'Titles': counted})[counted > 0]
+
+    def series(self, values, rows):
+        """Return values of rows in long form (Media, title, Fiscal Half, Start Date, value) for charting."""
+        long = pd.DataFrame({
+            'Media': np.repeat(self.media[rows], self.shape[1]),
+            self.level: np.repeat(self.names[rows], self.shape[1]),
+            'Fiscal Half': np.tile(self.windows, len(rows)),
+            'Start Date': np.tile(self.window_starts, len(rows)),
+            self.metric: values[rows].ravel()
+        })
+        return long.dropna(subset=[self.metric])
+
+    def leaders(self, n=500, media_type=None):
+        """Return the names of the n rows with the highest total metric, for pickers over large catalogs."""
+        rows = self.rows(media_type)
+        totals = self.values[rows].sum(axis=1)
+        if len(rows) > n:
+            keep = np.argpartition(-totals, n)[:n]
+            rows, totals = rows[keep], totals[keep]
+        return self.names[rows[np.argsort(-totals, kind='stable')]].tolist()
@@ -0,0 +1,91 @@
+import os
+import logging
+import threading
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+import cache
+import metrics
+
+
+# HELPER VARIABLES
+logger = logging.getLogger('netflix_viewership.watcher')
+
+# Seconds without filesystem events, and without size or mtime changes, before a reload starts
+debounce_seconds = float(os.environ.get('WATCH_DEBOUNCE_SECONDS', 2))
+
+
+# HELPER FUNCTIONS
+def is_export(path):
+    """Return True for Excel exports, ignoring Office lock files and hidden files."""
+    name = os.path.basename(path)
+    return name.endswith('.xlsx') and not name.startswith(('~$', '.'))
+
+
+# WATCHER
+class ExportsWatcher(FileSystemEventHandler):
+    """Reload a ViewershipDataset in the background when workbooks in its folder are added, changed or removed.
+
+    Events are debounced until the folder has been quiet for a full window, so files that are still
+    being written or downloaded are never ingested. Re-ingestion runs on the watcher thread and the
+    dataset publishes the new snapshot only once it is complete; readers keep the previous one meanwhile.
+    """
+
+    def __init__(self, dataset, debounce=debounce_seconds):
+        self.dataset = dataset
+        self.debounce = debounce
+        self._pending = threading.Event()
+        self._stopped = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def on_any_event(self, event):
+        """Flag a pending reload for any event that touches an export."""
+        paths = [event.src_path, getattr(event, 'dest_path', '')]
+        if not event.is_directory and any(is_export(path) for path in paths if path):
+            self._pending.set()
+
+    def settle(self):
+        """Wait until a debounce window passes with no events and an unchanged folder; False if stopped."""
+        while True:
+            self._pending.clear()
+            fingerprint = cache.folder_fingerprint(self.dataset.folder_path)
+            if self._stopped.wait(self.debounce):
+                return False
+            if not self._pending.is_set() and cache.folder_fingerprint(self.dataset.folder_path) == fingerprint:
+                return True
+
+    def run(self):
+        """Reload the dataset after each settled burst of events until stopped."""
+        while True:
+            self._pending.wait()
+            if self._stopped.is_set() or not self.settle():
+                return
+            try:
+                if self.dataset.reload():
+                    metrics.increment('watcher_reloads')
+                    logger.info("Reloaded %s as version %s", self.dataset.folder_path, self.dataset.version)
+            except Exception:
+                # A workbook may still be unreadable; the next event on it retries the reload
+                metrics.increment('watcher_reload_errors')
+                logger.exception("Reloading %s failed", self.dataset.folder_path)
+
+    def start(self):
+        """Start watching the dataset folder and return self."""
+        os.makedirs(self.dataset.folder_path, exist_ok=True)
+        self._observer = Observer()
+        self._observer.daemon = True
+        self._observer.schedule(self, self.dataset.folder_path, recursive=False)
+        self._observer.start()
+        self._thread = threading.Thread(target=self.run, name='exports-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the observer and the reload thread."""
+        self._stopped.set()
+        self._pending.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        if self._thread is not None:
+            self._thread.join()